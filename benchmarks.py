@@ -0,0 +1,499 @@
+import concurrent.futures
+import geopandas as gpd
+import http.server
+import multiprocessing
+import numpy as np
+import os
+import pandas as pd
+import shapely
+import sys
+import requests
+import tempfile
+import threading
+import time
+import tracemalloc
+import us
+import zipfile
+
+import main
+
+
+# Size of the real pipeline: counties in the contiguous states and days of
+# NYT history up to the last date analyzed.
+SYNTHETIC_COUNTIES = 3100
+SYNTHETIC_DAYS = 316
+SYNTHETIC_END_DATE = '2020-12-01'
+
+# Multiples of the number of counties and of days for each benchmark scale.
+SYNTHETIC_SCALES = {
+    '1x': (1, 1),
+    '10x': (10, 1),
+    '100x': (10, 10),
+}
+
+# Largest number of county-days generated. The 100x scale, with about 98
+# million county-days and a dense regression panel of the same size, would
+# need tens of GB, so it is skipped unless the limit is raised.
+SYNTHETIC_MAX_COUNTY_DAYS = 20000000
+
+# Stand-in pages in the layout of the scraped sources, built from the county
+# names in the Census shape file with made-up vote counts.
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class SavedResponse:
+    """Stands in for a requests.Response built from a saved page."""
+
+    def __init__(self, text, url=None):
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.status_code = 200
+        self.headers = {}
+        self.url = url
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def raise_for_status(self):
+        pass
+
+
+def saved_page_patcher(path):
+    """Replaces the shared session of main.py with one whose get method
+    serves the page saved at path. Returns a dictionary that counts the
+    number of calls.
+    """
+
+    with open(path, encoding='utf-8') as file:
+        text = file.read()
+
+    calls = {'count': 0}
+
+    def fake_get(url, *args, **kwargs):
+        calls['count'] += 1
+        return SavedResponse(text, url)
+
+    session = requests.Session()
+    session.get = fake_get
+    main._http_session = session
+
+    return calls
+
+
+def legacy_usda_extractor():
+    """Reproduces the original USDA scrape, which fetched and parsed the page
+    once for the discarded raw contents and once more for each column.
+    """
+
+    main.get_usda_raw_contents()
+
+    columns = [('01001', '56045', 1), ('Autauga', 'Weston', 1), ('AL', 'AS', 0)]
+    for first, last, offset in columns:
+        main.fips_column_creator(main.get_usda_raw_contents(), first, last, offset)
+
+
+def usda_benchmark(path=os.path.join(FIXTURE_DIR, 'usda.html'), repeats=3):
+    """Times the legacy USDA scrape against the fetch-once record set using a
+    saved copy of the USDA page (by default the one in FIXTURE_DIR), and
+    prints the number of network calls and the average time for each.
+    """
+
+    original_session = main._http_session
+    original_cache = main.CACHE_DIR, main.CACHE_TTL
+    calls = saved_page_patcher(path)
+
+    # Every request must reach the network stand-in to be counted, so the
+    # source cache lives in a scratch directory and never treats an entry as
+    # fresh.
+    main.CACHE_DIR = tempfile.mkdtemp()
+    main.CACHE_TTL = 0
+
+    try:
+        results = {}
+        for name, func in [('legacy', legacy_usda_extractor),
+                           ('fetch-once', main.usda_extractor)]:
+            calls['count'] = 0
+            start = time.perf_counter()
+            for _ in range(repeats):
+                func()
+            elapsed = (time.perf_counter() - start) / repeats
+            results[name] = (calls['count'] / repeats, elapsed)
+    finally:
+        main._http_session = original_session
+        main.CACHE_DIR, main.CACHE_TTL = original_cache
+
+    print('{:<12}{:>15}{:>15}'.format('USDA', 'network calls', 'seconds'))
+    for name, (count, elapsed) in results.items():
+        print('{:<12}{:>15.0f}{:>15.3f}'.format(name, count, elapsed))
+
+    return results
+
+
+def parse_benchmark(wiki_path=os.path.join(FIXTURE_DIR, 'wiki.html'),
+                    townhall_path=os.path.join(FIXTURE_DIR, 'townhall', 'NM.html'),
+                    repeats=20):
+    """Times the BeautifulSoup and lxml parsers on saved Wikipedia and
+    townhall.com pages, checks that both return the same rows, and prints the
+    average time for each.
+    """
+
+    pages = {}
+    for name, path in [('wiki', wiki_path), ('townhall', townhall_path)]:
+        with open(path, 'rb') as file:
+            pages[name] = file.read()
+
+    parsers = {'wiki': main.wiki_table_parser, 'townhall': main.townhall_page_parser}
+
+    results = {}
+    for name, func in parsers.items():
+        outputs = {}
+        for backend in ['bs4', 'lxml']:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                outputs[backend] = func(pages[name], backend)
+            results[(name, backend)] = (time.perf_counter() - start) / repeats
+
+        if outputs['bs4'] != outputs['lxml']:
+            raise ValueError('The parsers disagree on the {} page.'.format(name))
+
+    print('{:<12}{:>15}{:>15}'.format('Page', 'bs4 seconds', 'lxml seconds'))
+    for name in parsers:
+        print('{:<12}{:>15.4f}{:>15.4f}'.format(name, results[(name, 'bs4')],
+                                               results[(name, 'lxml')]))
+
+    return results
+
+
+class SavedPageHandler(http.server.BaseHTTPRequestHandler):
+    """Serves <directory>/<name>.html for a request to /<name> and records
+    the path and client port of every request in the server's log.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.log.append((self.path, self.client_address[1]))
+
+        fname = os.path.join(self.server.directory, self.path.strip('/') + '.html')
+        if not os.path.exists(fname):
+            self.send_error(404)
+            return
+
+        with open(fname, 'rb') as file:
+            content = file.read()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def townhall_benchmark(directory=os.path.join(FIXTURE_DIR, 'townhall'), max_workers=8):
+    """Runs the townhall.com scrape against a local server of the pages saved in
+    directory, checks that each is requested once over at most max_workers
+    connections, and prints the requests, connections, counties, and time.
+    """
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), SavedPageHandler)
+    server.directory = directory
+    server.log = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    original_session = main._http_session
+    original_cache = main.CACHE_DIR
+    main._http_session = None
+    main.CACHE_DIR = tempfile.mkdtemp()
+
+    try:
+        url = 'http://127.0.0.1:{}/{{}}'.format(server.server_address[1])
+        states = main.get_states()
+        start = time.perf_counter()
+        pages = main.townhall_page_fetcher(states, url, max_workers)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+        main._http_session = original_session
+        main.CACHE_DIR = original_cache
+
+    paths = [path for path, _ in server.log]
+    connections = len(set(port for _, port in server.log))
+
+    if sorted(paths) != sorted('/' + state for state in states):
+        raise ValueError('Each state page was not requested exactly once.')
+    if connections > max_workers:
+        raise ValueError('{} connections were opened for {} workers.'.format(
+            connections, max_workers))
+
+    print('{:<12}{:>12}{:>12}{:>12}{:>12}'.format('Townhall', 'requests', 'connections',
+                                                  'counties', 'seconds'))
+    print('{:<12}{:>12}{:>12}{:>12}{:>12.3f}'.format('stand-in', len(paths), connections,
+                                                     sum(len(page['COUNTY']) for page in pages),
+                                                     elapsed))
+
+    return pages
+
+
+def synthetic_data_generator(counties=SYNTHETIC_COUNTIES, days=SYNTHETIC_DAYS, seed=0):
+    """Generates every source the pipeline reads for the given number of
+    counties and days, with a toy shape file archive in main.DATA_DIR, and
+    returns the cases, state votes, county votes, population, and density.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    states = us.states.STATES_CONTIGUOUS
+    state_index = np.sort(rng.integers(0, len(states), counties))
+    state_fips = np.array([int(state.fips) for state in states])[state_index]
+    county_numbers = np.zeros(counties, dtype='int64')
+    for state in np.unique(state_index):
+        in_state = state_index == state
+        county_numbers[in_state] = np.arange(1, in_state.sum() + 1)
+    fips = (state_fips * 1000 + county_numbers).astype('int32')
+    state_names = np.array([state.name for state in states])[state_index]
+
+    population = np.round(rng.lognormal(10.3, 1.4, counties)).astype('int32') + 100
+    area = rng.lognormal(6.5, 0.8, counties)
+    clinton_share = rng.beta(2, 3, counties)
+    turnout = np.round(population * rng.uniform(0.3, 0.5, counties))
+    clinton_votes = np.round(turnout * clinton_share).astype('int32')
+    trump_votes = (turnout - clinton_votes).astype('int32')
+
+    dates = pd.date_range(end=SYNTHETIC_END_DATE, periods=days)
+    growth = np.exp(np.linspace(0, 6, days))[:, None]
+    daily_rate = population[None, :] * 1e-6 * growth * rng.uniform(0.5, 2, counties)
+    cumulative = np.cumsum(rng.poisson(daily_rate), axis=0)
+    first_day = rng.integers(0, max(days // 2, 1), counties)
+    reported = np.arange(days)[:, None] >= first_day[None, :]
+    day_index, county_index = np.nonzero(reported)
+
+    cases = pd.DataFrame({
+        'DATE': dates[day_index],
+        'COUNTY': np.char.add('County ', county_numbers.astype(str))[county_index],
+        'STATE': state_names[county_index],
+        'COUNTYFP': fips[county_index],
+        'CASES': cumulative[day_index, county_index],
+        'DEATHS': np.floor(cumulative[day_index, county_index] * 0.02),
+    })
+
+    state_votes = (pd.DataFrame({'STATE': state_names,
+                                 'CLINTON_VOTES': clinton_votes.astype('int64'),
+                                 'TRUMP_VOTES': trump_votes.astype('int64')})
+                     .groupby('STATE', as_index=False)
+                     .sum())
+
+    county_votes = pd.DataFrame({'COUNTYFP': fips,
+                                 'CLINTON_COUNTY_VOTES': clinton_votes,
+                                 'TRUMP_COUNTY_VOTES': trump_votes})
+
+    columns = int(np.ceil(np.sqrt(counties * 2.4)))
+    size = 57 / columns
+    x = -124 + (np.arange(counties) % columns) * size
+    y = 25 + (np.arange(counties) // columns) * size
+    geoid = np.char.zfill(fips.astype(str), 5)
+    shapes = gpd.GeoDataFrame(
+        {'STATEFP': np.char.zfill(state_fips.astype(str), 2),
+         'COUNTYFP': np.char.zfill(county_numbers.astype(str), 3),
+         'COUNTYNS': np.char.zfill(np.arange(counties).astype(str), 8),
+         'AFFGEOID': np.char.add('0500000US', geoid),
+         'GEOID': geoid,
+         'NAME': np.char.add('County ', county_numbers.astype(str)),
+         'LSAD': '06',
+         'ALAND': np.round(area * 1e6).astype('int64'),
+         'AWATER': 0},
+        geometry=shapely.box(x, y, x + size, y + size),
+        crs='EPSG:4269'
+    )
+    shape_file_archiver(shapes)
+
+    data = {
+        'cases': main.schema_applier(cases),
+        'votes': main.party_calculator(state_votes),
+        'county_votes': main.vote_margin_calculator(county_votes),
+        'population': pd.DataFrame({'COUNTYFP': fips, 'POP_EST_2019': population}),
+        'density': main.schema_applier(pd.DataFrame({'COUNTYFP': fips,
+                                                     'POP_DENSITY': population / area})),
+    }
+
+    return data
+
+
+def shape_file_archiver(shapes):
+    """Writes shapes as a shape file archive in main.DATA_DIR, along with the
+    file recording its hash, as main.shape_file_downloader leaves them.
+    """
+
+    archive_path = os.path.join(main.DATA_DIR, '{}.zip'.format(main.SHAPEFILE_NAME))
+    os.makedirs(main.DATA_DIR, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as directory:
+        shapes.to_file(os.path.join(directory, '{}.shp'.format(main.SHAPEFILE_NAME)))
+        with zipfile.ZipFile(archive_path, 'w') as zip_folder:
+            for ending in main.SHAPEFILE_MEMBERS:
+                member = '{}.{}'.format(main.SHAPEFILE_NAME, ending)
+                zip_folder.write(os.path.join(directory, member), member)
+
+    main.cache_writer(archive_path + '.sha256',
+                      main.file_hasher([archive_path]).encode('utf-8'))
+
+
+def synthetic_benchmark(scales=None, seed=0, memory=True,
+                        max_county_days=SYNTHETIC_MAX_COUNTY_DAYS):
+    """Times, and with memory set traces, the analysis and plotting steps on
+    synthetic data at each of SYNTHETIC_SCALES up to max_county_days, offline
+    in scratch directories, and prints a table of the results.
+    """
+
+    if scales is None:
+        scales = list(SYNTHETIC_SCALES)
+
+    original_directory = os.getcwd()
+    original_offline = main.OFFLINE
+    main.OFFLINE = True
+
+    results = []
+    try:
+        for scale in scales:
+            county_factor, day_factor = SYNTHETIC_SCALES[scale]
+            county_count = SYNTHETIC_COUNTIES * county_factor
+            day_count = SYNTHETIC_DAYS * day_factor
+
+            if county_count * day_count > max_county_days:
+                print('Skipping {}: {:,} county-days is over the limit of {:,}.'.format(
+                    scale, county_count * day_count, max_county_days))
+                continue
+
+            with tempfile.TemporaryDirectory() as directory:
+                os.chdir(directory)
+                try:
+                    results.extend(synthetic_step_timer(scale, county_count, day_count,
+                                                        seed, memory))
+                finally:
+                    os.chdir(original_directory)
+    finally:
+        os.chdir(original_directory)
+        main.OFFLINE = original_offline
+
+    print('{:<8}{:<28}{:>12}{:>12}{:>12}'.format('Scale', 'Step', 'Rows', 'Seconds',
+                                                  'Peak MB'))
+    for result in results:
+        print('{:<8}{:<28}{:>12}{:>12.2f}{:>12.1f}'.format(
+            result['SCALE'], result['STEP'], result['ROWS'], result['SECONDS'],
+            result['PEAK_MB']))
+
+    df = pd.DataFrame(results)
+
+    return df
+
+
+def synthetic_step_timer(scale, county_count, day_count, seed=0, memory=True):
+    """Returns the time and peak traced memory of each step on synthetic data
+    of the given size, rendering in a spawned process as the pipeline does.
+    """
+
+    data = synthetic_data_generator(county_count, day_count, seed)
+
+    geo = main.geometry_preparer()
+    counties = main.county_store_builder(data['population'], data['density'],
+                                         data['county_votes'], geo)
+    county_geometry = main.county_geometry_selector(geo)
+    df = main.data_merger(data['cases'], data['votes'], counties, geo)
+    latest = main.latest_slicer(df)
+    cube = main.case_cube_updater(df)
+    infection_map = main.choropleth_infection_data(latest, county_geometry)
+    vote_map = main.choropleth_vote_data(latest, county_geometry, counties)
+    density_map = main.choropleth_density_data(latest, county_geometry, counties)
+    panel = main.ols_panel_builder(df, counties)
+
+    # Each step is a function, its arguments, and whether it renders.
+    steps = {
+        'data_merger': (main.data_merger, [data['cases'], data['votes'], counties, geo],
+                        False),
+        'bin_creator': (main.bin_creator, [df], False),
+        'region_grouper': (main.region_grouper, [df], False),
+        'case_cube_updater': (main.case_cube_updater, [df], False),
+        'plotter': (main.plotter, [cube], True),
+        'choropleth_infection_data': (main.choropleth_infection_data,
+                                      [latest, county_geometry], False),
+        'choropleth_infection': (main.choropleth_infection, [infection_map], True),
+        'choropleth_vote_data': (main.choropleth_vote_data,
+                                 [latest, county_geometry, counties], False),
+        'choropleth_vote': (main.choropleth_vote, [vote_map], True),
+        'choropleth_density_data': (main.choropleth_density_data,
+                                    [latest, county_geometry, counties], False),
+        'choropleth_density': (main.choropleth_density, [density_map], True),
+        'ols_panel_builder': (main.ols_panel_builder, [df, counties], False),
+        'run_ols': (main.run_ols, [panel], False),
+    }
+
+    render_pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=main.render_initializer
+    )
+
+    results = []
+    try:
+        render_pool.submit(os.getpid).result()
+
+        for name, (func, args, renders) in steps.items():
+            start = time.perf_counter()
+            if renders:
+                render_pool.submit(func, *args).result()
+            else:
+                func(*args)
+            seconds = time.perf_counter() - start
+
+            peak = np.nan
+            if memory:
+                if renders:
+                    peak = render_pool.submit(step_tracer, func, *args).result()
+                else:
+                    peak = step_tracer(func, *args)
+
+            results.append({'SCALE': scale, 'STEP': name, 'ROWS': len(df),
+                             'SECONDS': seconds, 'PEAK_MB': peak})
+    finally:
+        render_pool.shutdown()
+
+    return results
+
+
+def step_tracer(func, *args):
+    """Calls func with args under tracemalloc and returns the peak memory in
+    MB that it allocated.
+    """
+
+    tracemalloc.start()
+    try:
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'usda'
+    if command == 'parse':
+        parse_benchmark(*sys.argv[2:4])
+    elif command == 'townhall':
+        townhall_benchmark(*sys.argv[2:3])
+    elif command == 'synthetic':
+        synthetic_benchmark(sys.argv[2:] or None)
+    elif command == 'usda':
+        usda_benchmark(*sys.argv[2:3])
+    else:
+        usda_benchmark(command)
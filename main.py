@@ -1,23 +1,167 @@
+import argparse
 from bs4 import BeautifulSoup
+import concurrent.futures
+import contextvars
+import cProfile
 import datetime
+import functools
 import geopandas as gpd
 from geopandas import GeoDataFrame
+import hashlib
+import inspect
 import io
 import json
+import lxml.html
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from matplotlib.dates import DateFormatter
+import multiprocessing
 import numpy as np
-import operator
 import os
 import pandas as pd
+import pyogrio
 import requests
-import statsmodels.formula.api as smf
+import resource
+import shapely
+import shutil
+import statsmodels.api as sm
+import threading
+import time
 import us
 import zipfile
 
 
-def main():
+WIKI_URL = 'https://en.wikipedia.org/wiki/2016_United_States_presidential_election'
+TOWNHALL_URL = 'https://townhall.com/election/2016/president/{}/county'
+USDA_URL = 'https://www.nrcs.usda.gov/wps/portal/nrcs/detail/national/home/?cid=nrcs143_013697'
+CASES_URL = 'https://raw.githubusercontent.com/nytimes/covid-19-data/master/us-counties.csv'
+CASES_RECENT_URL = 'https://raw.githubusercontent.com/nytimes/covid-19-data/master/us-counties-recent.csv'
+POPULATION_URL = 'https://www.ers.usda.gov/webdocs/DataFiles/48747/PopulationEstimates.xls?v=6825.4'
+DENSITY_URL = 'https://opendata.arcgis.com/datasets/21843f238cbb46b08615fc53e19e0daf_1.geojson'
+SHAPEFILE_URL = 'https://www2.census.gov/geo/tiger/GENZ2018/shp/cb_2018_us_county_500k.zip'
+
+# Raw responses are stored under CACHE_DIR and reused without any request for
+# CACHE_TTL seconds, after which they are revalidated with a conditional
+# request. Entries unused for CACHE_MAX_AGE seconds are evicted, as are the
+# least recently used entries once the cache grows past CACHE_MAX_BYTES.
+# Downloads are streamed to disk in CACHE_CHUNKSIZE pieces. Setting
+# COVID_OFFLINE=1 serves everything from the cache without touching
+# the network.
+CACHE_DIR = '.source_cache'
+CACHE_TTL = 24 * 60 * 60
+CACHE_MAX_AGE = 30 * 24 * 60 * 60
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+CACHE_CHUNKSIZE = 1024 ** 2
+OFFLINE = os.environ.get('COVID_OFFLINE') == '1'
+
+# Every download goes through one pooled session that keeps up to
+# HTTP_POOLSIZE connections open per host.
+HTTP_POOLSIZE = 16
+
+# Local columnar copies of sources that are refreshed incrementally. The NYT
+# history is re-synced for the last CASES_RESYNC_DAYS days on every refresh
+# to pick up back-revisions. The pipeline reads cases through CASES_END_DATE.
+DATA_DIR = '.data_store'
+CASES_RESYNC_DAYS = 7
+CASES_CHUNKSIZE = 500000
+CASES_END_DATE = '2020-12-01'
+
+# Daily totals of the fact table by each of these columns, kept in DATA_DIR
+# and read by the time-series plots.
+CUBE_DIMENSIONS = ['PARTY_ID', 'REGION', 'STATE']
+
+# Regressions fit for every date, as the dependent variable and regressors
+# of each specification. An intercept is always included.
+OLS_SPECS = {
+    'Total Cases': ('CASES', ['BINARY_PARTY_ID', 'POP_EST_2019']),
+    'Infection Rate': ('INFECTION_RATE', ['BINARY_PARTY_ID']),
+    'Total Cases by Margin': ('CASES', ['COUNTY_PCT_DIFF', 'POP_EST_2019', 'POP_DENSITY']),
+    'Infection Rate by Margin': ('INFECTION_RATE', ['COUNTY_PCT_DIFF', 'POP_DENSITY']),
+}
+
+# Bootstrap and permutation draws used for inference on BINARY_PARTY_ID.
+# Draws are made in chunks of RESAMPLE_CHUNK, each seeded from RESAMPLE_SEED,
+# so results do not depend on the number of worker processes.
+RESAMPLES = 20000
+RESAMPLE_CHUNK = 250
+RESAMPLE_SEED = 2020
+
+# Simplification tolerances, in meters of the choropleth projection, stored
+# alongside the full resolution county outlines.
+GEOMETRY_TOLERANCES = [100, 250, 1000, 2500]
+
+# Width of the saved choropleths (17 inches at 800 dpi), which decides the
+# single outline resolution sent to each rendering process.
+CHOROPLETH_WIDTH_PIXELS = 17 * 800
+
+# Census county attributes read from the shape file, and the states (Alaska,
+# Hawaii and Puerto Rico) left out of the maps. Both are applied by GDAL
+# while reading, so the dropped records and fields are never built.
+SHAPEFILE_COLUMNS = ['STATEFP', 'COUNTYFP', 'COUNTYNS', 'AFFGEOID', 'GEOID', 'NAME',
+                     'LSAD', 'ALAND', 'AWATER']
+SHAPEFILE_DROP_STATES = ['02', '15', '72']
+
+# The county shape file, the members of its Census archive that GDAL reads,
+# and the size of the pieces the archive is streamed to disk in.
+SHAPEFILE_NAME = 'cb_2018_us_county_500k'
+SHAPEFILE_MEMBERS = ['shp', 'shx', 'dbf', 'prj', 'cpg']
+SHAPEFILE_CHUNKSIZE = 1024 ** 2
+
+# Typed columnar outputs of each pipeline stage, reused while the inputs
+# they were built from are unchanged.
+PIPELINE_DIR = '.pipeline_cache'
+
+# Every run appends one JSON line per stage it needed to TRACE_FILE, with
+# its timings, memory, row counts, and downloads.
+TRACE_FILE = os.path.join(PIPELINE_DIR, 'trace.jsonl')
+
+# Column types used for every dataframe in the script. Labels with only a few
+# distinct values are categoricals, FIPS codes are integers, and counts and
+# rates use the narrowest type that holds them.
+SCHEMA = {
+    'DATE': 'datetime64[ns]',
+    'COUNTYFP': 'int32',
+    'COUNTY': 'category',
+    'STATE': 'category',
+    'CASES': 'int32',
+    'DEATHS': 'float32',
+    'PARTY_ID': 'category',
+    'POP_EST_2019': 'int32',
+    'POP_DENSITY': 'float32',
+    'CLINTON_COUNTY_VOTES': 'int32',
+    'TRUMP_COUNTY_VOTES': 'int32',
+    'COUNTY_PCT_DIFF': 'float32',
+    'BINARY_PARTY_ID': 'int8',
+    'DEATH_RATE': 'float32',
+    'INFECTION_RATE': 'float32',
+    'INFECTION_BINS': 'category',
+    'DENSITY_BINS': 'category',
+    'VOTE_BINS': 'category',
+    'REGION': 'category',
+}
+
+_cache_lock = threading.Lock()
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+# SHA-256 hashes computed in this process, keyed on the path, size and
+# modification time of the files they cover.
+_file_digests = {}
+
+# Name of the pipeline stage running in the current context, and the bytes
+# downloaded on behalf of each stage in this process.
+_current_stage = contextvars.ContextVar('current_stage', default=None)
+_download_bytes = {}
+
+# Stages pass dataframes, column subsets, and row slices to each other
+# without defensive copies. Copy-on-write keeps those shared: a stage that
+# changes a column gets its own copy of just that column, and the data held
+# by other stages is never modified.
+pd.options.mode.copy_on_write = True
+
+
+def main(targets=None, export_csv=False, max_workers=8, force=False, profile=None):
     """Saves following files:
 
     1) Total votes by state for Clinton and Trump in 2016.
@@ -45,31 +189,282 @@ def main():
         Total Cases ~ Party Identification + Population Density
     13) A .txt file containing regression results where:
         Infection Rate ~ Party Identification
+    14) A .csv file containing the coefficients of every regression in
+        OLS_SPECS fit separately for every date.
+    15) A .csv file containing bootstrap standard errors and permutation
+        p-values for Party Identification in 12) and 13).
+
+    Files 1) through 7) are only written as .csv when export_csv is set, and
+    targets limits the run to the named stages of pipeline_stages().
     """
 
-    print('Running script, please wait about two minutes!')
+    print('Running script, please wait about two minutes on a cold run!')
+
+    stages = pipeline_stages(max_workers)
 
-    votes = wiki_extractor()
-    votes = wiki_cleaner(votes)
-    votes = party_calculator(votes)
+    if targets is None:
+        targets = [name for name, stage in stages.items()
+                       if stage['memo'] == 'marker' and name != 'csv']
+    if export_csv:
+        targets = list(targets) + ['csv']
 
-    county_votes = county_vote_extractor()
-    fips = usda_extractor()
-    cases = cases_loader()
-    population = population_loader()
-    density = density_loader()
+    results = pipeline_runner(stages, targets, max_workers, force, profile)
 
-    county_fips_combined = county_fips_merger(county_votes, fips)
-    county_fips_combined = vote_margin_calculator(county_fips_combined)
+    memory_reporter({name: result for name, result in results.items()
+                         if isinstance(result, pd.DataFrame)})
+
+    print('The files have been saved!')
 
-    geo = geo_data_loader()
-    geo = geo_data_cleaner(geo)
 
-    df = data_merger(cases, votes, population, density,
-                     county_fips_combined, geo)
+def pipeline_stages(max_workers=8):
+    """Declares the pipeline as a dictionary of stages, each naming its
+    function, input stages, sources fingerprint, pool, and memo ('table',
+    'marker', or None). max_workers caps the concurrent downloads of every
+    stage.
+    """
+
+    def stage(func, inputs=(), sources=None, pool='thread', memo='table', outputs=(),
+              fan_out=False):
+        return {'func': func, 'inputs': list(inputs), 'sources': sources,
+                'pool': pool, 'memo': memo, 'outputs': list(outputs), 'fan_out': fan_out}
+
+    def townhall_urls():
+        return [TOWNHALL_URL.format(state) for state in get_states()]
+
+    def county_votes_loader():
+        return county_vote_extractor(max_workers=max_workers)
+
+    stages = {
+        'votes': stage(votes_loader,
+                       sources=lambda: source_fingerprint([WIKI_URL], max_workers)),
+        'county_votes': stage(county_votes_loader,
+                              sources=lambda: source_fingerprint(townhall_urls(), max_workers)),
+        'fips': stage(usda_extractor,
+                      sources=lambda: source_fingerprint([USDA_URL], max_workers)),
+        'cases': stage(mapped_cases_loader, ['geo'], sources=cases_fingerprint),
+        'population': stage(population_loader,
+                            sources=lambda: source_fingerprint([POPULATION_URL], max_workers)),
+        'density': stage(density_loader,
+                         sources=lambda: source_fingerprint([DENSITY_URL], max_workers)),
+        'geo': stage(geometry_preparer, sources=shapefile_fingerprint, memo=None),
+        'county_fips_combined': stage(county_fips_combiner, ['county_votes', 'fips']),
+        'counties': stage(county_store_builder, ['population', 'density',
+                                                 'county_fips_combined', 'geo']),
+        'df': stage(data_merger, ['cases', 'votes', 'counties', 'geo']),
+        'latest': stage(latest_slicer, ['df'], memo=None),
+        'cube': stage(case_cube_updater, ['df'], memo=None),
+        'county_geometry': stage(county_geometry_selector, ['geo'], memo=None),
+        'csv': stage(csv_exporter, ['votes', 'county_votes', 'fips', 'cases',
+                                    'population', 'density', 'df'], memo='marker',
+                     outputs=['Votes by State in 2016.csv', 'Votes by County in 2016.csv',
+                              'FIPS codes.csv', 'Reported Daily Coronavirus Cases.csv',
+                              'Poplation Estimates 2019.csv',
+                              'Population Density Estimates.csv', 'Final Dataframe.csv']),
+        'lineplots': stage(plotter, ['cube'], pool='process', memo='marker',
+                           outputs=['Lineplots.png']),
+        'infection_map': stage(choropleth_infection_data, ['latest', 'county_geometry'],
+                               memo=None),
+        'vote_map': stage(choropleth_vote_data, ['latest', 'county_geometry', 'counties'],
+                          memo=None),
+        'density_map': stage(choropleth_density_data,
+                             ['latest', 'county_geometry', 'counties'], memo=None),
+        'choropleth_infection': stage(choropleth_infection, ['infection_map'],
+                                      pool='process', memo='marker',
+                                      outputs=['Infection Choropleth.png']),
+        'choropleth_vote': stage(choropleth_vote, ['vote_map'], pool='process', memo='marker',
+                                 outputs=['Vote Choropleth.png']),
+        'choropleth_density': stage(choropleth_density, ['density_map'],
+                                    pool='process', memo='marker',
+                                    outputs=['Density Choropleth.png']),
+        'panel': stage(ols_panel_builder, ['df', 'counties'], memo=None),
+        'ols': stage(run_ols, ['panel'], memo='marker',
+                     outputs=['Regressions by Date.csv', 'Total Cases Regression.txt',
+                              'Infection Rate Regression.txt']),
+        'resampling': stage(run_resampling, ['panel'], memo='marker',
+                            outputs=['Party Resampling Inference.csv'], fan_out=True),
+    }
 
-    df = bin_creator(df)
-    df = region_grouper(df)
+    return stages
+
+
+def pipeline_runner(stages, targets, max_workers=8, force=False, profile=None):
+    """Runs the target stages and whatever they depend on, reusing memoized
+    results whose fingerprints match, and returns the results that were
+    needed. Every stage that runs or fails is traced by trace_reporter.
+    """
+
+    profile = set(profile or [])
+
+    order = []
+
+    def visit(name):
+        if name not in order:
+            for input_name in stages[name]['inputs']:
+                visit(input_name)
+            order.append(name)
+
+    for target in targets:
+        visit(target)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        source_futures = {name: executor.submit(stage_context_runner, name,
+                                                stages[name]['sources'])
+                              for name in order if stages[name]['sources'] is not None}
+        source_fingerprints = {name: future.result()
+                                   for name, future in source_futures.items()}
+
+    source_bytes = {name: _download_bytes.get(name, 0) for name in order}
+
+    fingerprints = {}
+    for name in order:
+        stage = stages[name]
+        fingerprints[name] = fingerprint_combiner(
+            name,
+            code_fingerprint(stage['func']),
+            source_fingerprints.get(name, ''),
+            *[fingerprints[input_name] for input_name in stage['inputs']]
+        )
+
+    memoized = {name: not force and stage_memo_exists(name, fingerprints[name],
+                                                      stages[name]['memo'],
+                                                      stages[name]['outputs'])
+                    for name in order}
+
+    required = set()
+
+    def require(name):
+        if name not in required:
+            required.add(name)
+            if not memoized[name]:
+                for input_name in stages[name]['inputs']:
+                    require(input_name)
+
+    for target in targets:
+        require(target)
+
+    remaining = [name for name in order if name in required]
+    results = {}
+    metrics = {}
+    errors = {}
+    pending = {}
+
+    thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    process_pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=render_initializer
+    )
+    try:
+        while remaining or pending:
+            for name in list(remaining):
+                stage = stages[name]
+                if not memoized[name] and not all(input_name in results
+                                                  for input_name in stage['inputs']):
+                    continue
+
+                remaining.remove(name)
+                func = stage['func']
+                if memoized[name]:
+                    args = []
+                    pool = thread_pool
+                else:
+                    args = [results[input_name] for input_name in stage['inputs']]
+                    pool = process_pool if stage['pool'] == 'process' else thread_pool
+                    if stage['fan_out']:
+                        func = functools.partial(func, executor=process_pool)
+
+                future = pool.submit(stage_profiler, name, fingerprints[name], func,
+                                     *args, memo=stage['memo'], force=not memoized[name],
+                                     profile=name in profile)
+                pending[future] = name
+
+            done, _ = concurrent.futures.wait(pending,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    results[name], metrics[name] = future.result()
+                except Exception as error:
+                    errors[name] = error
+                    raise
+    finally:
+        thread_pool.shutdown(cancel_futures=True)
+        process_pool.shutdown(cancel_futures=True)
+
+        for future, name in pending.items():
+            if future.done() and not future.cancelled():
+                if future.exception() is None:
+                    results[name], metrics[name] = future.result()
+                else:
+                    errors[name] = future.exception()
+
+        trace_reporter(order, memoized, metrics, errors, source_bytes)
+
+    return results
+
+
+def render_initializer():
+    """Prepares a rendering process: selects the Agg backend and registers
+    the pandas date converters that the plots rely on.
+    """
+
+    plt.switch_backend('Agg')
+    pd.plotting.register_matplotlib_converters()
+
+
+def votes_loader():
+    """Returns the cleaned Wikipedia vote counts by state along with each
+    state's winning party.
+    """
+
+    df = party_calculator(wiki_cleaner(wiki_extractor()))
+
+    return df
+
+
+def mapped_cases_loader(dataframe):
+    """Loads the NYT cases through December 1, 2020 for the counties in the
+    shape file.
+    """
+
+    df = cases_loader(end_date=CASES_END_DATE, counties=dataframe['COUNTYFP'])
+
+    return df
+
+
+def county_fips_combiner(dataframe1, dataframe2):
+    """Matches county votes to FIPS codes and returns the Clinton vote margin
+    in each county.
+    """
+
+    df = vote_margin_calculator(county_fips_merger(dataframe1, dataframe2))
+
+    return df
+
+
+def latest_slicer(dataframe):
+    """Returns the rows for the date shown in the choropleths and used in the
+    regressions.
+    """
+
+    df = dataframe[dataframe['DATE'] == '2020-12-01']
+
+    return df
+
+
+def county_geometry_selector(dataframe):
+    """Returns the county codes and outlines, at every simplification level,
+    needed to draw the choropleths.
+    """
+
+    geometry_cols = [col for col in dataframe.columns if col.startswith('GEOMETRY')]
+    df = pd.DataFrame(dataframe[['COUNTYFP'] + geometry_cols])
+
+    return df
+
+
+def csv_exporter(votes, county_votes, fips, cases, population, density, df):
+    """Writes the intermediate and final dataframes as .csv files."""
 
     votes.to_csv('Votes by State in 2016.csv')
     county_votes.to_csv('Votes by County in 2016.csv')
@@ -78,89 +473,580 @@ def main():
     population.to_csv('Poplation Estimates 2019.csv')
     density.to_csv('Population Density Estimates.csv')
 
-    drop_cols = [
-        'COUNTYNS',
-        'AFFGEOID',
-        'GEOID',
-        'NAME',
-        'LSAD',
-        'ALAND',
-        'AWATER',
-        'GEOMETRY',
-        'INFECTION_BINS',
-        'DENSITY_BINS',
-        'VOTE_BINS',
-        'REGION'
-    ]
-    df.drop(drop_cols, 1).to_csv('Final Dataframe.csv', index=False)
+    final = df.assign(COUNTYFP=fips_formatter(df['COUNTYFP']))
+    final.to_csv('Final Dataframe.csv', index=False)
 
-    plotter(df)
-    choropleth_infection(df)
-    choropleth_vote(df)
-    choropleth_density(df)
 
-    run_ols(df)
+def schema_applier(dataframe):
+    """Casts every column of the dataframe that appears in SCHEMA to its
+    declared type.
+    """
 
-    print('The files have been saved!')
-    
+    dtypes = {col: dtype for col, dtype in SCHEMA.items() if col in dataframe.columns}
 
-def wiki_extractor():
-    """Scrapes wikipedia table to return a dataframe with the Clinton versus
-    Trump vote counts from 2016.
+    df = dataframe.astype(dtypes)
+
+    return df
+
+
+def fips_normalizer(values):
+    """Converts FIPS codes stored as integers, floats, or strings (with or
+    without leading zeros or a trailing '.0') into an int32 array using
+    whole-array operations.
     """
 
-    url = 'https://en.wikipedia.org/wiki/2016_United_States_presidential_election'
+    values = pd.Series(values)
+
+    if not pd.api.types.is_numeric_dtype(values):
+        values = pd.to_numeric(values.astype(str).str.strip())
 
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'lxml')
+    if values.isna().any():
+        raise ValueError('FIPS codes cannot be missing.')
 
-    tables = soup.find_all('table', {'class': 'wikitable sortable'})
-    election_table = tables[2]
+    fips = values.to_numpy()
+    if not np.array_equal(fips, np.floor(fips)):
+        raise ValueError('FIPS codes must be whole numbers.')
 
-    raw_links = []
-    for link in election_table.find_all('a', href=True):
-        raw_links.append(link['href'])
+    fips = fips.astype(SCHEMA['COUNTYFP'])
 
-    states = []
-    for link in raw_links:
-        if ('#' not in link):
-            states.append(link)
+    return fips
 
-    td_items = election_table.find_all('td')
-    td_text = [text.get_text() for text in td_items]
 
-    clinton_vote_indexes = []
-    for index, text in enumerate(td_text):
-        if text[0].isupper():
-            clinton_vote_indexes.append(index + 1)
+def fips_formatter(values):
+    """Converts integer FIPS codes into zero-padded five character strings."""
+
+    fips = np.char.zfill(np.asarray(values).astype(str), 5)
+
+    return fips
+
+
+def fips_validator(values, valid_values, source):
+    """Checks the unique FIPS codes from a source against the counties in the
+    shape file and prints how many of them cannot be mapped. Returns the
+    codes that were not found.
+    """
+
+    unique_fips = pd.unique(np.asarray(values))
+    missing = np.setdiff1d(unique_fips, np.asarray(valid_values))
+
+    if len(missing) > 0:
+        print('{}: {} of {} counties are not in the shape file.'.format(
+            source, len(missing), len(unique_fips)))
+
+    return missing
+
+
+def memory_reporter(dataframes):
+    """Prints the memory used by each stage's dataframe, including the
+    contents of string and categorical columns.
+    """
+
+    print('{:<24}{:>12}{:>12}'.format('Stage', 'Rows', 'MB'))
+    for name, dataframe in dataframes.items():
+        megabytes = dataframe.memory_usage(deep=True).sum() / 1024 ** 2
+        print('{:<24}{:>12,}{:>12.1f}'.format(name, len(dataframe), megabytes))
 
-    trump_vote_indexes = []
-    for index, text in enumerate(td_text):
-        if text[0].isupper():
-            trump_vote_indexes.append(index + 4)
 
-    clinton_votes = operator.itemgetter(*clinton_vote_indexes)(td_text) 
-    trump_votes = operator.itemgetter(*trump_vote_indexes)(td_text)
+def cache_index_loader():
+    """Returns the source cache index, which maps each url to the hash of its
+    stored content along with the validators and timestamps used to decide
+    whether it is still fresh.
+    """
+
+    index_path = os.path.join(CACHE_DIR, 'index.json')
+
+    if not os.path.exists(index_path):
+        return {}
+
+    with open(index_path) as file:
+        index = json.load(file)
+
+    return index
+
+
+def cache_writer(path, content):
+    """Writes content to path atomically so that an interrupted run never
+    leaves a partial file in the cache.
+    """
+
+    store_writer(path, lambda file: file.write(content))
+
+
+def store_writer(path, write, stale_prefix=None):
+    """Writes path atomically by calling write with a temporary file, then
+    deletes the other files in its directory that start with stale_prefix.
+    """
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    temp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+    try:
+        with open(temp_path, 'wb') as file:
+            write(file)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+
+    if stale_prefix is not None:
+        for fname in os.listdir(directory):
+            if (fname.startswith(stale_prefix) and not fname.endswith('.tmp')
+                    and fname != os.path.basename(path)):
+                os.remove(os.path.join(directory, fname))
+
+
+def cache_pruner(index):
+    """Evicts entries that have not been used within CACHE_MAX_AGE seconds,
+    then the least recently used entries until the stored content fits in
+    CACHE_MAX_BYTES. Content files no longer referenced are deleted.
+    """
+
+    now = time.time()
+
+    index = {url: entry for url, entry in index.items()
+                 if now - entry['last_used'] <= CACHE_MAX_AGE}
+
+    entries = sorted(index.items(), key=lambda item: item[1]['last_used'],
+                     reverse=True)
+
+    kept = {}
+    referenced = set()
+    total_size = 0
+    for url, entry in entries:
+        if entry['sha256'] not in referenced:
+            total_size += entry['size']
+        if total_size > CACHE_MAX_BYTES:
+            break
+        kept[url] = entry
+        referenced.add(entry['sha256'])
+
+    blob_dir = os.path.join(CACHE_DIR, 'blobs')
+    blobs = os.listdir(blob_dir) if os.path.exists(blob_dir) else []
+    for fname in blobs:
+        if fname not in referenced:
+            os.remove(os.path.join(blob_dir, fname))
+
+    return kept
+
+
+def http_session():
+    """Returns the pooled requests.Session shared by every download, creating
+    it on first use.
+    """
+
+    global _http_session
 
-    vote_share_dict = {
-        'STATE': states,
-        'CLINTON_VOTES': clinton_votes,
-        'TRUMP_VOTES': trump_votes,
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOLSIZE,
+                                                    pool_maxsize=HTTP_POOLSIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_session = session
+
+    return _http_session
+
+
+def cached_get(url, session=None):
+    """Returns the raw content at url, reading it from the on-disk source
+    cache whenever possible.
+    """
+
+    entry = cache_refresher(url, session)
+
+    with open(os.path.join(CACHE_DIR, 'blobs', entry['sha256']), 'rb') as file:
+        content = file.read()
+
+    return content
+
+
+def cached_path(url, session=None):
+    """Returns the path of the on-disk copy of the content at url, refreshing
+    it first when needed, so that large files can be streamed from disk.
+    """
+
+    entry = cache_refresher(url, session)
+
+    path = os.path.join(CACHE_DIR, 'blobs', entry['sha256'])
+
+    return path
+
+
+def cache_refresher(url, session=None):
+    """Makes sure the source cache holds a usable copy of url, streaming it to
+    disk when it is missing or stale, and returns its index entry.
+    """
+
+    with _cache_lock:
+        entry = cache_index_loader().get(url)
+
+    if entry is not None and not os.path.exists(os.path.join(CACHE_DIR, 'blobs',
+                                                             entry['sha256'])):
+        entry = None
+
+    if entry is None and OFFLINE:
+        raise FileNotFoundError('{} is not in the source cache and offline mode is on.'.format(url))
+
+    now = time.time()
+    temp_path = None
+    if entry is None or (not OFFLINE and now - entry['fetched_at'] >= CACHE_TTL):
+        headers = {}
+        if entry is not None and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry is not None and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        if session is None:
+            session = http_session()
+
+        with session.get(url, headers=headers, stream=True) as response:
+            if entry is None or response.status_code != 304:
+                response.raise_for_status()
+                temp_path = os.path.join(CACHE_DIR, 'tmp', '{}.{}'.format(
+                    os.getpid(), threading.get_ident()))
+                os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+                try:
+                    sha256, size = response_streamer(response, temp_path, CACHE_CHUNKSIZE)
+                except BaseException:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    raise
+                entry = {
+                    'sha256': sha256,
+                    'size': size,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }
+        entry['fetched_at'] = now
+
+    entry['last_used'] = now
+
+    # The new content is only moved into the blob store once the lock is
+    # held, together with the index entry that refers to it, so that a
+    # concurrent refresh never prunes it as unreferenced in between.
+    with _cache_lock:
+        if temp_path is not None:
+            blob_path = os.path.join(CACHE_DIR, 'blobs', entry['sha256'])
+            if os.path.exists(blob_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(temp_path, blob_path)
+        index = cache_index_loader()
+        index[url] = entry
+        index = cache_pruner(index)
+        cache_writer(os.path.join(CACHE_DIR, 'index.json'),
+                     json.dumps(index, indent=2).encode('utf-8'))
+
+    return entry
+
+
+def response_streamer(response, path, chunk_size):
+    """Streams the body of a response to path in chunk_size pieces and
+    returns its SHA-256 hash and size. Raises an IOError when the body is
+    shorter or longer than its Content-Length header.
+    """
+
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as file:
+        for chunk in response.iter_content(chunk_size):
+            file.write(chunk)
+            hasher.update(chunk)
+            size += len(chunk)
+    download_recorder(size)
+
+    expected_size = response.headers.get('Content-Length')
+    if (expected_size is not None and 'Content-Encoding' not in response.headers
+            and int(expected_size) != size):
+        raise IOError('Downloaded {} of {} bytes from {}.'.format(size, expected_size,
+                                                                 response.url))
+
+    return hasher.hexdigest(), size
+
+
+def source_fingerprint(urls, max_workers=8):
+    """Refreshes the cached copy of every url concurrently and returns a hash
+    of their contents without reading them, so that a stage can tell whether
+    any of its sources changed since its output was saved.
+    """
+
+    context = contextvars.copy_context()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(context.copy().run, cache_refresher, url) for url in urls]
+        entries = [future.result() for future in futures]
+
+    fingerprint = fingerprint_combiner(*[entry['sha256'] for entry in entries])
+
+    return fingerprint
+
+
+def fingerprint_combiner(*parts):
+    """Hashes any number of strings into a single fingerprint."""
+
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(part.encode('utf-8'))
+        hasher.update(b'\0')
+
+    fingerprint = hasher.hexdigest()
+
+    return fingerprint
+
+
+def stage_runner(name, fingerprint, func, *args, memo='table', force=False):
+    """Returns the output of a pipeline stage, reading a 'table' memo back from
+    parquet or skipping a 'marker' stage when one exists for the fingerprint,
+    unless memo is None or force is set.
+    """
+
+    if memo is None:
+        return func(*args)
+
+    path = stage_memo_path(name, fingerprint, memo)
+
+    if not force and os.path.exists(path):
+        return pd.read_parquet(path) if memo == 'table' else None
+
+    result = func(*args)
+
+    store_writer(path, result.to_parquet if memo == 'table' else lambda file: None,
+                 stale_prefix=name + '-')
+
+    return result
+
+
+def stage_profiler(name, fingerprint, func, *args, memo='table', force=False,
+                   profile=False):
+    """Runs a stage through stage_runner, under cProfile when profile is set,
+    and returns its output with its wall and CPU seconds, peak memory, rows
+    in and out, and bytes downloaded.
+    """
+
+    tables = [arg for arg in args if isinstance(arg, pd.DataFrame)]
+    rows_in = sum(len(table) for table in tables) if tables else None
+    downloaded_before = _download_bytes.get(name, 0)
+    peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+
+    profiler = cProfile.Profile() if profile else None
+    if profiler is not None:
+        profiler.enable()
+
+    try:
+        result = stage_context_runner(name, stage_runner, name, fingerprint, func, *args,
+                                      memo=memo, force=force)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(PIPELINE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PIPELINE_DIR, '{}.pstats'.format(name)))
+
+    metrics = {
+        'wall_seconds': time.perf_counter() - wall_start,
+        'cpu_seconds': time.thread_time() - cpu_start,
+        'peak_rss_before_mb': peak_before,
+        'peak_rss_after_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'rows_in': rows_in,
+        'rows_out': len(result) if isinstance(result, pd.DataFrame) else None,
+        'bytes_downloaded': _download_bytes.get(name, 0) - downloaded_before,
     }
 
-    df = pd.DataFrame(vote_share_dict)
+    return result, metrics
+
+
+def stage_context_runner(name, func, *args, **kwargs):
+    """Calls func with the named stage marked as running, so that downloads
+    made on its behalf are counted towards it.
+    """
+
+    token = _current_stage.set(name)
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        _current_stage.reset(token)
+
+    return result
+
+
+def download_recorder(size):
+    """Adds size bytes to the downloads of the stage running in the current
+    context.
+    """
+
+    with _cache_lock:
+        stage = _current_stage.get()
+        _download_bytes[stage] = _download_bytes.get(stage, 0) + size
+
+
+def trace_reporter(order, memoized, metrics, errors, source_bytes):
+    """Appends a record for every stage that ran or failed to TRACE_FILE and
+    prints them as a table.
+    """
+
+    run_id = datetime.datetime.now().isoformat(timespec='seconds')
+    records = []
+    for name in order:
+        if name in metrics or name in errors:
+            record = {'run': run_id, 'stage': name, 'memoized': memoized[name]}
+            if name in metrics:
+                record.update(metrics[name])
+                record['bytes_downloaded'] += source_bytes[name]
+                record['error'] = None
+            else:
+                record['error'] = '{}: {}'.format(type(errors[name]).__name__, errors[name])
+            records.append(record)
+
+    trace_writer(records)
+
+    print('{:<24}{:>10}{:>10}{:>10}{:>10}{:>10}{:>12}{:>12}{:>10}'.format(
+        'Stage', 'Memoized', 'Seconds', 'CPU', 'Peak MB', '+MB', 'Rows in', 'Rows out',
+        'MB down'))
+    for record in records:
+        if record['error'] is not None:
+            print('{:<24}{:>10}  failed: {}'.format(
+                record['stage'], 'yes' if record['memoized'] else 'no', record['error']))
+            continue
+        print('{:<24}{:>10}{:>10.1f}{:>10.1f}{:>10.0f}{:>10.0f}{:>12}{:>12}{:>10.1f}'.format(
+            record['stage'],
+            'yes' if record['memoized'] else 'no',
+            record['wall_seconds'],
+            record['cpu_seconds'],
+            record['peak_rss_after_mb'],
+            record['peak_rss_after_mb'] - record['peak_rss_before_mb'],
+            record['rows_in'] if record['rows_in'] is not None else '',
+            record['rows_out'] if record['rows_out'] is not None else '',
+            record['bytes_downloaded'] / 1024 ** 2
+        ))
+
+
+def trace_writer(records):
+    """Appends one JSON line per record to TRACE_FILE."""
+
+    os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+    with open(TRACE_FILE, 'a') as file:
+        for record in records:
+            file.write(json.dumps(record) + '\n')
+
+
+def stage_memo_path(name, fingerprint, memo):
+    """Returns where the memoized result of a stage is kept."""
+
+    extension = 'parquet' if memo == 'table' else 'done'
+    path = os.path.join(PIPELINE_DIR, '{}-{}.{}'.format(name, fingerprint[:16], extension))
+
+    return path
+
+
+def stage_memo_exists(name, fingerprint, memo, outputs=()):
+    """Checks whether a stage has a memoized result for the fingerprint and
+    whether every file it writes is still there.
+    """
+
+    if memo is None:
+        return False
+
+    exists = (os.path.exists(stage_memo_path(name, fingerprint, memo))
+              and all(os.path.exists(fname) for fname in outputs))
+
+    return exists
+
+
+def code_fingerprint(func):
+    """Returns a hash of the source of func and of the functions and upper-case
+    constants of its module that it uses, directly or through other functions.
+    """
+
+    namespace = func.__globals__
+    parts = []
+    seen = set()
+    pending = [func]
+
+    def referenced_names(code):
+        yield from code.co_names
+        for const in code.co_consts:
+            if inspect.iscode(const):
+                yield from referenced_names(const)
+
+    while pending:
+        current = pending.pop()
+        parts.append(inspect.getsource(current))
+
+        for name in sorted(set(referenced_names(current.__code__))):
+            if name in seen or name not in namespace:
+                continue
+            seen.add(name)
+
+            value = inspect.unwrap(namespace[name]) if callable(namespace[name]) else namespace[name]
+            if inspect.isfunction(value) and value.__module__ == func.__module__:
+                pending.append(value)
+            elif (name.isupper() and isinstance(value, (str, int, float, list, tuple, dict))
+                  and not isinstance(value, bool)):
+                parts.append('{} = {!r}'.format(name, value))
+
+    fingerprint = fingerprint_combiner(*parts)
+
+    return fingerprint
+
+
+def wiki_extractor(parser='lxml'):
+    """Scrapes wikipedia table to return a dataframe with the Clinton versus
+    Trump vote counts from 2016, parsed with the given parser backend.
+    """
+
+    df = pd.DataFrame(wiki_table_parser(cached_get(WIKI_URL), parser))
 
     return df
 
 
+def wiki_table_parser(html, parser='lxml'):
+    """Returns each state's link and its Clinton and Trump vote cells, read by
+    position from the rows of the table of results by state, using lxml and
+    XPath or, with parser='bs4', BeautifulSoup.
+    """
+
+    columns = {'STATE': [], 'CLINTON_VOTES': [], 'TRUMP_VOTES': []}
+
+    if parser == 'bs4':
+        soup = BeautifulSoup(html, 'lxml')
+        election_table = soup.find_all('table', {'class': 'wikitable sortable'})[2]
+
+        for row in election_table.find_all('tr'):
+            cells = row.find_all('td', recursive=False)
+            links = [link['href'] for link in cells[0].find_all('a', href=True)
+                         if '#' not in link['href']] if len(cells) >= 5 else []
+            if links:
+                columns['STATE'].append(links[0])
+                columns['CLINTON_VOTES'].append(cells[1].get_text())
+                columns['TRUMP_VOTES'].append(cells[4].get_text())
+
+        return columns
+
+    tree = lxml.html.fromstring(html, parser=lxml.html.HTMLParser(encoding='utf-8'))
+
+    election_table = tree.xpath('//table[@class="wikitable sortable"]')[2]
+
+    # A state's row links to the state in its first cell and has its
+    # Clinton votes in the second cell and its Trump votes in the fifth.
+    rows = election_table.xpath('.//tr[count(td) >= 5][td[1]//a[not(contains(@href, "#"))]]')
+
+    columns['STATE'] = [row.xpath('td[1]//a[not(contains(@href, "#"))]/@href')[0]
+                            for row in rows]
+    columns['CLINTON_VOTES'] = [row.xpath('string(td[2])') for row in rows]
+    columns['TRUMP_VOTES'] = [row.xpath('string(td[5])') for row in rows]
+
+    return columns
+
+
 def wiki_cleaner(dataframe):
     """Extracts only the name of the state from hyperlinks in the State column,
     and cleans up vote counts to manipulatable numeric format.
     """
 
-    df = dataframe.copy()
-
-    df = df.replace(',', '', regex=True)
+    df = dataframe.replace(',', '', regex=True)
     cols = ['CLINTON_VOTES', 'TRUMP_VOTES']
     df[cols] = df[cols].apply(pd.to_numeric, errors='coerce')
 
@@ -181,7 +1067,7 @@ def party_calculator(dataframe):
     given state is red or blue.
     """
 
-    df = dataframe.copy()
+    df = dataframe.copy(deep=False)
 
     df['PARTY_ID'] = np.where(
         df['CLINTON_VOTES'] > df['TRUMP_VOTES'],
@@ -213,91 +1099,74 @@ def get_states():
     return states
 
 
-def county_vote_extractor():
-    """Turns the raw html text from townhall.com into a dataframe containing
-    vote counts by candidate by county. Cleans up number formatting and
-    creates new column that will be used to join on FIPS codes.
+def townhall_page_parser(html, parser='lxml'):
+    """Returns the name and the Clinton and Trump vote cells of each county row
+    of a townhall.com state page, using lxml and XPath or, with parser='bs4',
+    BeautifulSoup.
     """
 
-    def get_townhall_raw_contents():
-        """Loops through townhall.com for each state and returns the raw
-        html text on each page into a list.
-        """
-
-        states = get_states()
-
-        raw_text = []
-        for state in states:
-            response = requests.get('https://townhall.com/election/2016/president/{}/county'.format(state))
-            soup = BeautifulSoup(response.text, 'html.parser')
-            tables = soup.find_all('table', attrs={'class': 'table ec-table'})
-
-            for table in tables:
-                table_cells = table.find_all('td')
-
-                for cell in table_cells:
-                    cell_contents = cell.get_text()
-                    raw_text.append(cell_contents)
-
-        return raw_text
-
-    raw_text = get_townhall_raw_contents()
-
-    def county_names_retriever():
-        """Extracts and cleans county names from the list containing the raw 
-        html output.
-        """
-
-        county_names = [item for item in raw_text if item.startswith('\n')]
-        county_names = [text.split('\n')[1] for text in county_names]
-
-        return county_names
-
-    def state_extractor():
-        """Returns a list of states that correspond to each county."""
-
-        states = get_states()
+    columns = {'COUNTY': [], 'CLINTON_COUNTY_VOTES': [], 'TRUMP_COUNTY_VOTES': []}
+
+    if parser == 'bs4':
+        soup = BeautifulSoup(html, 'html.parser')
+        rows = []
+        for table in soup.find_all('table', attrs={'class': 'table ec-table'}):
+            for row in table.find_all('tr'):
+                cells = [cell.get_text() for cell in row.find_all('td', recursive=False)]
+                names = [div.get_text() for div in row.td.find_all('div')
+                             if not div.attrs] if cells else []
+                if names:
+                    rows.append((names[0], cells))
+    else:
+        tree = lxml.html.fromstring(html, parser=lxml.html.HTMLParser(encoding='utf-8'))
+        rows = [(row.xpath('string(td[1]/div[not(@*)])'),
+                 [cell.text_content() for cell in row.xpath('td')])
+                    for row in tree.xpath('//table[@class="table ec-table"]'
+                                          '//tr[td[1]/div[not(@*)]]')]
 
-        counts = []
-        for state in states:
-            response = requests.get('https://townhall.com/election/2016/president/{}/county'.format(state))
-            soup = BeautifulSoup(response.text, 'html.parser')
-            tables = soup.find_all('table', attrs={'class': 'table ec-table'})
+    for county, cells in rows:
+        votes = dict(zip(cells[1::2], cells[2::2]))
+        columns['COUNTY'].append(county)
+        columns['CLINTON_COUNTY_VOTES'].append(votes['Hillary Clinton'])
+        columns['TRUMP_COUNTY_VOTES'].append(votes['Donald Trump'])
 
-            for table in tables:
-                div_tags = table.find_all('div')
-                counts.append(
-                    sum(1 for div in div_tags if str(div).startswith('<div>'))
-                )
+    return columns
 
-        state_county_counts = dict(zip(states, counts))
 
-        nested_states = [[state] * county_count for state, county_count in state_county_counts.items()]
+def townhall_page_fetcher(states, url, max_workers=8, parser='lxml'):
+    """Downloads and parses the townhall.com page for each state concurrently
+    over the shared pooled session. Returns a list of the columns parsed by
+    townhall_page_parser in the same order as the states passed in.
+    """
 
-        states_column = [state for sublist in nested_states for state in sublist]
+    def fetch(state):
+        return townhall_page_parser(cached_get(url.format(state)), parser)
 
-        return states_column
+    context = contextvars.copy_context()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(context.copy().run, fetch, state) for state in states]
+        pages = [future.result() for future in futures]
 
-    def vote_getter(candidate_name):
-        """Stores the vote count from each county for a specified candidate
-        into a list.
-        """
+    return pages
 
-        vote_indexes = []
-        for index, text in enumerate(raw_text):
-            if text == candidate_name:
-                vote_indexes.append(index + 1)
 
-        candidate_votes = operator.itemgetter(*vote_indexes)(raw_text)
+def county_vote_extractor(url=TOWNHALL_URL, max_workers=8, parser='lxml'):
+    """Turns the raw html text from townhall.com into a dataframe containing
+    vote counts by candidate by county. Cleans up number formatting and
+    creates new column that will be used to join on FIPS codes.
+    """
 
-        return candidate_votes
+    states = get_states()
+    pages = townhall_page_fetcher(states, url, max_workers, parser)
 
     df = pd.DataFrame(
         {
-            'COUNTY': county_names_retriever(),
-            'STATE': state_extractor(),
-            'CLINTON_COUNTY_VOTES': vote_getter('Hillary Clinton'),
-            'TRUMP_COUNTY_VOTES': vote_getter('Donald Trump'),
+            'COUNTY': [name for page in pages for name in page['COUNTY']],
+            'STATE': np.repeat(states, [len(page['COUNTY']) for page in pages]),
+            'CLINTON_COUNTY_VOTES': [votes for page in pages
+                                         for votes in page['CLINTON_COUNTY_VOTES']],
+            'TRUMP_COUNTY_VOTES': [votes for page in pages
+                                       for votes in page['TRUMP_COUNTY_VOTES']],
         }
     )
 
@@ -332,218 +1201,566 @@ def county_vote_extractor():
     return df
 
 
-def usda_extractor():
-    """Turns the raw data scraped from the USDA into a dataframe containing
-    FIPS codes, counties, and state abbreviations.
+def usda_extractor():
+    """Turns the raw data scraped from the USDA into a dataframe containing
+    FIPS codes, counties, and state abbreviations.
+    """
+
+    raw_info = get_usda_raw_contents()
+
+    df = usda_records(raw_info).reset_index(drop=True)
+
+    df['COUNTY'] = [name[:-4] if name.endswith('City') else name for name in df['COUNTY']]
+
+    fips_replacements = {
+        '29510': 'St Louis City',
+        '51019': 'Bedford County',
+        '51600': 'Fairfax City',
+        '51059': 'Fairfax County',
+        '51067': 'Franklin County',
+        '51159': 'Richmond County',
+        '51161': 'Roanoke County'
+    }
+    df['COUNTY'] = df['FIPS'].map(fips_replacements).fillna(df['COUNTY'])
+
+    df['MATCH_ID'] = df['COUNTY'] + df['STATE']
+    df['MATCH_ID'] = [id.lower() for id in df['MATCH_ID']]
+    df['MATCH_ID'] = (df['MATCH_ID'].str.replace(' ', '')
+                                    .str.replace('.', ''))
+
+    df = df[['FIPS', 'MATCH_ID']]
+
+    return df
+
+
+def get_usda_raw_contents():
+    """Scrapes the USDA website and returns its raw html contents as a list of
+    text.
+    """
+
+    soup = BeautifulSoup(cached_get(USDA_URL), 'html.parser')
+    cells = soup.find_all('td')
+    raw_info = [cell.get_text() for cell in cells]
+
+    return raw_info
+
+
+def fips_column_creator(raw_info, first, last, offset):
+    """Using data from USDA, this function dentifies the index positions of all
+    FIPS codes, county names, and state abbreviations and extracts the data
+    for each of the aforementioned variables into a list.
+    """
+
+    first_item = raw_info.index(first)
+    last_item = raw_info.index(last) + offset
+    items = raw_info[first_item:last_item:3]
+
+    return items
+
+
+def usda_records(raw_info):
+    """Parses the raw USDA contents into the FIPS codes, county names, and
+    state abbreviations indexed by FIPS code.
+    """
+
+    df = pd.DataFrame(
+        {
+            'FIPS': fips_column_creator(raw_info, '01001', '56045', 1),
+            'COUNTY': fips_column_creator(raw_info, 'Autauga', 'Weston', 1),
+            'STATE': fips_column_creator(raw_info, 'AL', 'AS', 0),
+        }
+    )
+
+    df = df.set_index('FIPS', drop=False).rename_axis(None)
+
+    return df
+
+
+def county_fips_merger(dataframe1, dataframe2):
+    """Merges FIPS code data from USDA with votes by county data from
+    townhall.com.
+    """
+
+    df = pd.merge(dataframe1, dataframe2, on='MATCH_ID')
+
+    df.iat[223, 5] = '08017'
+    df.iat[1166, 5] = '24510'
+    df.iat[1167, 5] = '24005'
+    df.iat[2383, 5] = '46111'
+    df.iat[2385, 5] = '46117'
+
+    df = df[df['COUNTY'] != 'Alaska']
+
+    df = df[['FIPS', 'CLINTON_COUNTY_VOTES', 'TRUMP_COUNTY_VOTES']]
+    df.columns = ['COUNTYFP', 'CLINTON_COUNTY_VOTES', 'TRUMP_COUNTY_VOTES']
+
+    df['COUNTYFP'] = fips_normalizer(df['COUNTYFP'])
+
+    # Need to add county oglala lakota manually because it's not included in the usda website
+    oglala_lakota = {
+        'COUNTYFP': 46102,
+        'CLINTON_COUNTY_VOTES': 2504,
+        'TRUMP_COUNTY_VOTES': 241
+    }
+    df = df.append(oglala_lakota, ignore_index=True)
+
+    return df
+
+
+def vote_margin_calculator(dataframe):
+    """Creates new column that reports the Clinton vote margin
+    as a percentage difference from Trump's vote share. The vote counts are
+    kept for the county attribute store.
+    """
+
+    df = dataframe[['COUNTYFP', 'CLINTON_COUNTY_VOTES', 'TRUMP_COUNTY_VOTES']]
+    df = schema_applier(df)
+
+    clinton_votes = df['CLINTON_COUNTY_VOTES'].to_numpy(dtype='float64')
+    trump_votes = df['TRUMP_COUNTY_VOTES'].to_numpy(dtype='float64')
+
+    total_votes = clinton_votes + trump_votes
+    margin = np.divide(clinton_votes, total_votes)
+    margin -= np.divide(trump_votes, total_votes, out=total_votes)
+
+    df['COUNTY_PCT_DIFF'] = margin
+
+    df = schema_applier(df)
+
+    return df
+
+
+def cases_loader(incremental=True, end_date=None, states=None, counties=None):
+    """Stores case and death csv data from NYT's respository into dataframe,
+    keeping rows on or before end_date in the given states and counties, read
+    from the store kept by cases_store_refresher when incremental.
+    """
+
+    if not incremental:
+        return cases_csv_reader(CASES_URL, end_date, states, counties)
+
+    store_dir = cases_store_refresher(end_date, states)
+
+    cases = cases_store_reader(store_dir, end_date, counties)
+
+    return cases
+
+
+def cases_fingerprint(end_date=CASES_END_DATE):
+    """Brings the case store up to date for end_date and returns a hash of
+    the partitions that are read for it.
+    """
+
+    store_dir = cases_store_refresher(end_date)
+
+    fingerprint = file_hasher(cases_partition_finder(store_dir, end_date))
+
+    return fingerprint
+
+
+def cases_store_refresher(end_date=None, states=None):
+    """Updates the monthly parquet store of NYT's history for the given states,
+    reading the recent file only when end_date reaches its resync window, and
+    returns its directory.
+    """
+
+    store_filter = fingerprint_combiner(repr(sorted(states) if states is not None else None))
+    store_dir = os.path.join(DATA_DIR, 'us-counties-{}'.format(store_filter[:16]))
+
+    partitions = sorted(os.listdir(store_dir)) if os.path.exists(store_dir) else []
+
+    if not partitions:
+        cases_store_builder(store_dir, cases_chunk_reader(CASES_URL, None, states))
+        return store_dir
+
+    last_partition = os.path.join(store_dir, partitions[-1])
+    high_water_mark = pd.read_parquet(last_partition, columns=['DATE'])['DATE'].max()
+    resync_start = high_water_mark - pd.Timedelta(days=CASES_RESYNC_DAYS)
+
+    if end_date is not None and pd.Timestamp(end_date) < resync_start:
+        return store_dir
+
+    try:
+        recent = cases_csv_reader(CASES_RECENT_URL, None, states, start_date=resync_start)
+    except (requests.RequestException, FileNotFoundError) as error:
+        print('Keeping the stored cases, the recent file is unavailable: {}'.format(error))
+        return store_dir
+
+    if recent.empty:
+        return store_dir
+
+    recent_start = recent['DATE'].min()
+    if high_water_mark + pd.Timedelta(days=1) < recent_start:
+        cases_store_builder(store_dir, cases_chunk_reader(CASES_URL, None, states))
+    else:
+        cases_partition_writer(store_dir, recent, max(resync_start, recent_start))
+
+    return store_dir
+
+
+def cases_store_builder(store_dir, chunks):
+    """Replaces the case store at store_dir with one built from the chunks,
+    written to a temporary directory that is swapped in once complete.
+    """
+
+    temp_dir = store_dir + '.tmp'
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+    os.makedirs(temp_dir)
+
+    for chunk in chunks:
+        cases_partition_writer(temp_dir, chunk)
+
+    old_dir = store_dir + '.old'
+    if os.path.exists(store_dir):
+        os.replace(store_dir, old_dir)
+    os.replace(temp_dir, store_dir)
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+
+
+def cases_partition_writer(store_dir, cases, cutoff=None):
+    """Writes cases into the monthly partitions at store_dir, replacing the
+    stored rows on or after cutoff and keeping each partition sorted.
+    """
+
+    months = cases['DATE'].dt.strftime('%Y-%m')
+
+    for month, rows in cases.groupby(months.to_numpy(), sort=True):
+        path = os.path.join(store_dir, '{}.parquet'.format(month))
+
+        if os.path.exists(path):
+            stored = pd.read_parquet(path)
+            if cutoff is not None:
+                stored = stored[stored['DATE'] < cutoff]
+            rows = schema_applier(pd.concat([stored, rows], ignore_index=True))
+
+        rows = rows.sort_values(['DATE', 'COUNTYFP'], kind='mergesort', ignore_index=True)
+
+        store_writer(path, lambda file: rows.to_parquet(file, index=False))
+
+
+def cases_store_reader(store_dir, end_date=None, counties=None):
+    """Reads the partitioned case store at store_dir and returns the rows on
+    or before end_date for the given county FIPS codes.
+    """
+
+    filters = None
+    if counties is not None:
+        filters = [('COUNTYFP', 'in', np.unique(np.asarray(counties)).tolist())]
+
+    cases = pd.concat([pd.read_parquet(path, filters=filters)
+                           for path in cases_partition_finder(store_dir, end_date)],
+                      ignore_index=True)
+    cases = schema_applier(cases)
+
+    if end_date is not None:
+        cases = cases[cases['DATE'] <= end_date].reset_index(drop=True)
+
+    for column in cases.select_dtypes('category'):
+        cases[column] = cases[column].cat.remove_unused_categories()
+
+    return cases
+
+
+def cases_partition_finder(store_dir, end_date=None):
+    """Returns the paths of the partitions of the case store at store_dir,
+    in order, skipping those for months after end_date.
+    """
+
+    partitions = sorted(fname for fname in os.listdir(store_dir) if fname.endswith('.parquet'))
+    if end_date is not None:
+        last_month = pd.Timestamp(end_date).strftime('%Y-%m')
+        partitions = [fname for fname in partitions if fname[:7] <= last_month]
+
+    paths = [os.path.join(store_dir, fname) for fname in partitions]
+
+    return paths
+
+
+def cases_csv_reader(url, end_date=None, states=None, counties=None, start_date=None):
+    """Streams one of NYT's county csv files in chunks and returns the rows
+    that pass the filters described in cases_loader, along with start_date
+    when given, with the column names and types used throughout the script.
+    """
+
+    cases = pd.concat(cases_chunk_reader(url, end_date, states, counties, start_date),
+                      ignore_index=True)
+    cases = schema_applier(cases)
+
+    return cases
+
+
+def cases_chunk_reader(url, end_date=None, states=None, counties=None, start_date=None):
+    """Yields the rows of one of NYT's county csv files between start_date and
+    end_date in the given states and counties, filtering one chunk of
+    CASES_CHUNKSIZE rows at a time. Rows without a FIPS code are dropped.
+    """
+
+    dtypes = {
+        'date': str,
+        'county': str,
+        'state': str,
+        'fips': 'float64',
+        'cases': 'float64',
+        'deaths': 'float64',
+    }
+
+    if counties is not None:
+        counties = np.asarray(counties)
+    if start_date is not None:
+        start_date = pd.Timestamp(start_date).strftime('%Y-%m-%d')
+    if end_date is not None:
+        end_date = pd.Timestamp(end_date).strftime('%Y-%m-%d')
+
+    with open(cached_path(url), 'rb') as file:
+        for chunk in pd.read_csv(file, usecols=list(dtypes), dtype=dtypes,
+                                 chunksize=CASES_CHUNKSIZE):
+            keep = chunk['fips'].notna().to_numpy()
+            if start_date is not None:
+                keep &= (chunk['date'] >= start_date).to_numpy()
+            if end_date is not None:
+                keep &= (chunk['date'] <= end_date).to_numpy()
+            if states is not None:
+                keep &= chunk['state'].isin(states).to_numpy()
+            if counties is not None:
+                keep &= np.isin(chunk['fips'].to_numpy(), counties)
+
+            chunk = chunk[keep]
+            chunk.columns = ['DATE', 'COUNTY', 'STATE', 'COUNTYFP', 'CASES', 'DEATHS']
+            chunk['COUNTYFP'] = fips_normalizer(chunk['COUNTYFP'])
+
+            yield schema_applier(chunk)
+
+
+def population_loader():
+    """Returns a dataframe with population estimates from 2019 in each US 
+    County using USDA data.
+    """
+
+    cols = ['FIPStxt', 'POP_ESTIMATE_2019']
+    df = pd.read_excel(
+        io.BytesIO(cached_get(POPULATION_URL)),
+        skiprows=range(0, 2),
+        usecols=cols,
+    )
+
+    df.columns = ['COUNTYFP', 'POP_EST_2019']
+
+    df = df.dropna()
+    df['COUNTYFP'] = fips_normalizer(df['COUNTYFP'])
+    df = schema_applier(df)
+
+    return df
+
+
+def density_loader():
+    """Loads population density by county from the U.S. Census into a
+    dataframe, reading only the columns used and keeping them as parquet in
+    DATA_DIR until the Census file changes.
     """
 
-    raw_info = get_usda_raw_contents()
+    source_path = cached_path(DENSITY_URL)
+    store_path = os.path.join(DATA_DIR, 'density-{}.parquet'.format(
+        os.path.basename(source_path)[:16]))
 
-    df = pd.DataFrame(
-        {
-            'FIPS': fips_column_creator('01001', '56045', 1),
-            'COUNTY': fips_column_creator('Autauga', 'Weston', 1),
-            'STATE': fips_column_creator('AL', 'AS', 0),
-        }
-    )
+    if os.path.exists(store_path):
+        return pd.read_parquet(store_path)
 
-    df['COUNTY'] = [name[:-4] if name.endswith('City') else name for name in df['COUNTY']]
+    df = pyogrio.read_dataframe(source_path, columns=['GEOID', 'B01001_calc_PopDensity'],
+                                read_geometry=False)
 
-    df.at[1593, 'COUNTY'] = 'St Louis City'
-    df.at[2826, 'COUNTY'] = 'Bedford County'
-    df.at[2923, 'COUNTY'] = 'Fairfax City'
-    df.at[2845, 'COUNTY'] = 'Fairfax County'
-    df.at[2849, 'COUNTY'] = 'Franklin County'
-    df.at[2892, 'COUNTY'] = 'Richmond County'
-    df.at[2893, 'COUNTY'] = 'Roanoke County'
+    df.columns = ['COUNTYFP', 'POP_DENSITY']
+    df['COUNTYFP'] = fips_normalizer(df['COUNTYFP'])
 
-    df['MATCH_ID'] = df['COUNTY'] + df['STATE']
-    df['MATCH_ID'] = [id.lower() for id in df['MATCH_ID']]
-    df['MATCH_ID'] = (df['MATCH_ID'].str.replace(' ', '')
-                                    .str.replace('.', ''))
+    df = schema_applier(df)
 
-    df = df[['FIPS', 'MATCH_ID']]
+    store_writer(store_path, lambda file: df.to_parquet(file, index=False),
+                 stale_prefix='density-')
 
     return df
 
 
-def get_usda_raw_contents():
-    """Scrapes the USDA website and returns its raw html contents as a list of
-    text.
+def get_shape_files():
+    """Returns the path that GeoPandas reads the county shape file from: the
+    shape file inside the verified Census archive in DATA_DIR (see
+    shape_file_downloader), read in place through GDAL's /vsizip/ path.
     """
 
-    fips_url = 'https://www.nrcs.usda.gov/wps/portal/nrcs/detail/national/home/?cid=nrcs143_013697'
+    archive_path = shape_file_downloader()
 
-    response = requests.get(fips_url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    cells = soup.find_all('td')
-    raw_info = [cell.get_text() for cell in cells]
+    shp_path = '/vsizip/{}/{}.shp'.format(archive_path, SHAPEFILE_NAME)
 
-    return raw_info
+    return shp_path
 
 
-def fips_column_creator(first, last, offset):
-    """Using data from USDA, this function dentifies the index positions of all
-    FIPS codes, county names, and state abbreviations and extracts the data
-    for each of the aforementioned variables into a list.
+def shape_file_downloader():
+    """Returns the path of a verified copy of the Census shape file archive in
+    DATA_DIR, downloading it, checking its size and CRCs, and recording its
+    hash when the stored copy is missing or no longer matches.
     """
 
-    raw_info = get_usda_raw_contents()
+    archive_path = os.path.join(DATA_DIR, '{}.zip'.format(SHAPEFILE_NAME))
+    checksum_path = archive_path + '.sha256'
 
-    first_item = raw_info.index(first)
-    last_item = raw_info.index(last) + offset
-    items = raw_info[first_item:last_item:3]
+    if os.path.exists(archive_path) and os.path.exists(checksum_path):
+        with open(checksum_path) as file:
+            if file.read().strip() == file_hasher([archive_path]):
+                return archive_path
 
-    return items
+    if OFFLINE:
+        raise FileNotFoundError('{} is not in {} and offline mode is on.'.format(
+            SHAPEFILE_URL, DATA_DIR))
 
+    os.makedirs(DATA_DIR, exist_ok=True)
+    temp_path = archive_path + '.tmp'
 
-def county_fips_merger(dataframe1, dataframe2):
-    """Merges FIPS code data from USDA with votes by county data from
-    townhall.com.
-    """
+    try:
+        with http_session().get(SHAPEFILE_URL, stream=True) as response:
+            response.raise_for_status()
+            sha256, _ = response_streamer(response, temp_path, SHAPEFILE_CHUNKSIZE)
 
-    df = pd.merge(dataframe1, dataframe2, on='MATCH_ID')
+        with zipfile.ZipFile(temp_path) as zip_folder:
+            missing = set('{}.{}'.format(SHAPEFILE_NAME, ending)
+                              for ending in SHAPEFILE_MEMBERS) - set(zip_folder.namelist())
+            if missing:
+                raise IOError('{} is missing {}.'.format(SHAPEFILE_URL, sorted(missing)))
+            corrupt = zip_folder.testzip()
+            if corrupt is not None:
+                raise IOError('{} in {} is corrupt.'.format(corrupt, SHAPEFILE_URL))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
-    df.iat[223, 5] = '08017'
-    df.iat[1166, 5] = '24510'
-    df.iat[1167, 5] = '24005'
-    df.iat[2383, 5] = '46111'
-    df.iat[2385, 5] = '46117'
+    cache_writer(checksum_path, sha256.encode('utf-8'))
+    os.replace(temp_path, archive_path)
+    _file_digests[file_digest_key([archive_path])] = sha256
 
-    df = df[df['COUNTY'] != 'Alaska']
+    return archive_path
 
-    df = df[['FIPS', 'CLINTON_COUNTY_VOTES', 'TRUMP_COUNTY_VOTES']]
-    df.columns = ['COUNTYFP', 'CLINTON_COUNTY_VOTES', 'TRUMP_COUNTY_VOTES']
 
-    df['COUNTYFP'] = df['COUNTYFP'].astype(int)
+def geo_data_loader():
+    """Uses the shape files are either downloaded or already exist on the machine
+    to return a dataframe containing all the info required to create a map.
+    Only SHAPEFILE_COLUMNS of counties outside SHAPEFILE_DROP_STATES are read.
+    """
+
+    file_path = get_shape_files()
 
-    # Need to add county oglala lakota manually because it's not included in the usda website
-    oglala_lakota = {
-        'COUNTYFP': 46102,
-        'CLINTON_COUNTY_VOTES': 2504,
-        'TRUMP_COUNTY_VOTES': 241
-    }
-    df = df.append(oglala_lakota, ignore_index=True)
+    where = 'STATEFP NOT IN ({})'.format(
+        ', '.join("'{}'".format(state) for state in SHAPEFILE_DROP_STATES))
+    df = pyogrio.read_dataframe(file_path, columns=SHAPEFILE_COLUMNS, where=where,
+                                use_arrow=True)
 
     return df
 
 
-def vote_margin_calculator(dataframe):
-    """Creates new column that reports the Clinton vote margin
-    as a percentage difference from Trump's vote share.
+def geometry_preparer():
+    """Returns the cleaned and reprojected county shapes with simplified copies
+    in GEOMETRY_<tolerance> columns, cached as GeoParquet in DATA_DIR until the
+    shape files change.
     """
 
-    df = dataframe.copy()
+    fingerprint = fingerprint_combiner(shapefile_fingerprint(),
+                                       repr(GEOMETRY_TOLERANCES))
 
-    df['CLINTON_COUNTY_PCT'] = df['CLINTON_COUNTY_VOTES'] / (df['CLINTON_COUNTY_VOTES'] + df['TRUMP_COUNTY_VOTES'])
+    cache_path = os.path.join(DATA_DIR, 'geometry-{}.parquet'.format(fingerprint))
 
-    df['TRUMP_COUNTY_PCT'] = df['TRUMP_COUNTY_VOTES'] / (df['CLINTON_COUNTY_VOTES'] + df['TRUMP_COUNTY_VOTES'])
+    if os.path.exists(cache_path):
+        return gpd.read_parquet(cache_path)
 
-    df['COUNTY_PCT_DIFF'] = df['CLINTON_COUNTY_PCT'] - df['TRUMP_COUNTY_PCT']
+    df = geo_data_cleaner(geo_data_loader())
+    df = GeoDataFrame(pd.DataFrame(df), geometry='GEOMETRY', crs=df['GEOMETRY'].crs)
 
-    df = df[['COUNTYFP', 'COUNTY_PCT_DIFF']]
+    # Coverage simplification moves the borders that neighboring counties
+    # share together, so simplified maps have no gaps or overlaps. It needs
+    # GEOS 3.12; older installs fall back to simplifying each county alone.
+    geometries = df['GEOMETRY'].values.to_numpy()
+    for tolerance in GEOMETRY_TOLERANCES:
+        if hasattr(shapely, 'coverage_simplify'):
+            simplified = shapely.coverage_simplify(geometries, tolerance)
+        else:
+            simplified = shapely.simplify(geometries, tolerance, preserve_topology=True)
+        df['GEOMETRY_{}'.format(tolerance)] = gpd.GeoSeries(simplified, index=df.index,
+                                                            crs=df.crs)
 
-    return df
+    store_writer(cache_path, df.to_parquet, stale_prefix='geometry-')
 
+    return df
 
-def cases_loader():
-    """Stores case and death csv data from NYT's respository into dataframe."""
 
-    cases_url = 'https://raw.githubusercontent.com/nytimes/covid-19-data/master/us-counties.csv'
-    cases = pd.read_csv(cases_url)
+def shapefile_fingerprint():
+    """Makes sure the verified shape file archive is present and returns a
+    SHA-256 hash of it.
+    """
 
-    cases.columns = ['DATE', 'COUNTY', 'STATE', 'COUNTYFP', 'CASES', 'DEATHS']
+    fingerprint = file_hasher([shape_file_downloader()])
 
-    return cases
+    return fingerprint
 
 
-def population_loader():
-    """Returns a dataframe with population estimates from 2019 in each US 
-    County using USDA data.
+def file_hasher(fnames):
+    """Returns a SHA-256 hash of the contents of the files, reusing the hash
+    computed earlier in the run while their sizes and modification times match.
     """
 
-    url = 'https://www.ers.usda.gov/webdocs/DataFiles/48747/PopulationEstimates.xls?v=6825.4'
+    key = file_digest_key(fnames)
+    if key in _file_digests:
+        return _file_digests[key]
 
-    cols = ['FIPStxt', 'POP_ESTIMATE_2019']
-    df = pd.read_excel(
-        url,
-        skiprows=range(0, 2),
-        usecols=cols,
-    )
+    hasher = hashlib.sha256()
+    for fname in fnames:
+        with open(fname, 'rb') as file:
+            for chunk in iter(lambda: file.read(SHAPEFILE_CHUNKSIZE), b''):
+                hasher.update(chunk)
 
-    df.columns = ['COUNTYFP', 'POP_EST_2019']
+    fingerprint = hasher.hexdigest()
+    _file_digests[key] = fingerprint
 
-    return df
+    return fingerprint
 
 
-def density_loader():
-    """Loads population density by county from the U.S. Census into a 
-    dataframe.
+def file_digest_key(fnames):
+    """Returns the paths, sizes and modification times that identify the
+    current contents of the files.
     """
 
-    density_url = 'https://opendata.arcgis.com/datasets/21843f238cbb46b08615fc53e19e0daf_1.geojson'
-
-    df = gpd.read_file(density_url)
+    key = []
+    for fname in fnames:
+        stat = os.stat(fname)
+        key.append((os.path.abspath(fname), stat.st_size, stat.st_mtime_ns))
 
-    df = df[['GEOID', 'B01001_calc_PopDensity']]
-
-    df['GEOID'] = df['GEOID'].astype(float)
-    df.columns = ['COUNTYFP', 'POP_DENSITY']
+    return tuple(key)
 
-    return df
 
+def geometry_level_selector(dataframe, width_pixels):
+    """Returns the dataframe with its active geometry set to the outlines
+    picked by geometry_level_finder.
+    """
 
-def get_shape_files():
-    """Checks directory for necessary shape files. If files are not there, then
-    they are downloaded from the Census. Returns the path to the .dbf file
-    that is read by GeoPandas. If files are there, nothing is downloaded and
-    only a statement saying files exist is returned.
-    """
-
-    path = os.path.dirname(os.path.abspath("__file__"))
-
-    fnames = [
-        'cb_2018_us_county_500k.cpg',
-        'cb_2018_us_county_500k.prj',
-        'cb_2018_us_county_500k.dbf',
-        'cb_2018_us_county_500k.shx',
-        'cb_2018_us_county_500k.shp',
-        'cb_2018_us_county_500k.shp.iso.xml',
-        'cb_2018_us_county_500k.shp.ea.iso.xml'
-    ]
-    booleans = [os.path.exists(fname) for fname in fnames]
-
-    url = 'https://www2.census.gov/geo/tiger/GENZ2018/shp/cb_2018_us_county_500k.zip'
-
-    if False in booleans:
-        response = requests.get(url)
-        zip_folder = zipfile.ZipFile(io.BytesIO(response.content))
-        zip_folder.extractall(path=path)
-        file_endings = ['dbf', 'prj', 'shp', 'shx']
-        files = [file for file in zip_folder.namelist() if file.endswith(tuple(file_endings))]
-        dbf, prj, shp, shx = [file for file in files]
-        shp_path = os.path.join(path, shp)
-    else:
-        shp_path = 'Files already exist!'
+    df = dataframe.set_geometry(geometry_level_finder(dataframe, width_pixels))
 
-    return shp_path
+    return df
 
 
-def geo_data_loader():
-    """Uses the shape files are either downloaded or already exist on the machine
-    to return a dataframe containing all the info required to create a map.
+def geometry_level_finder(dataframe, width_pixels):
+    """Returns the column holding the coarsest outlines whose tolerance is below
+    one pixel at width_pixels, or the full resolution GEOMETRY column.
     """
 
-    path = os.path.dirname(os.path.abspath("__file__"))
-    file_path = get_shape_files()
+    tolerances = sorted(int(col.split('_')[1]) for col in dataframe.columns
+                            if col.startswith('GEOMETRY_'))
 
-    if file_path == 'Files already exist!':
-        fname = os.path.join(path, 'cb_2018_us_county_500k.dbf')
-        df = gpd.read_file(fname)
-    else:
-        df = gpd.read_file(file_path)
+    minx, _, maxx, _ = gpd.GeoSeries(dataframe['GEOMETRY']).total_bounds
+    meters_per_pixel = (maxx - minx) / width_pixels
 
-    return df
+    column = 'GEOMETRY'
+    for tolerance in tolerances:
+        if tolerance <= meters_per_pixel:
+            column = 'GEOMETRY_{}'.format(tolerance)
+
+    return column
 
 
 def geo_data_cleaner(dataframe):
@@ -551,10 +1768,7 @@ def geo_data_cleaner(dataframe):
     and the COVID-19 case data.
     """
 
-    df = dataframe.copy()
-
-    drop_counties = ['02', '15', '72']
-    df = df[~df['STATEFP'].isin(drop_counties)]
+    df = dataframe[~dataframe['STATEFP'].isin(SHAPEFILE_DROP_STATES)]
 
     projection = '+proj=laea +lat_0=30 +lon_0=-95'
     df = df.to_crs(projection)
@@ -573,106 +1787,154 @@ def geo_data_cleaner(dataframe):
         'geometry'
     ]]
     df.columns = [col.upper() for col in df.columns.values.tolist()]
-    df['COUNTYFP'] = df['COUNTYFP'].astype(int)
+    df['COUNTYFP'] = fips_normalizer(df['COUNTYFP'])
 
     return df
 
 
-def data_merger(dataframe1, dataframe2, dataframe3, dataframe4, dataframe5,
-                dataframe6):
-    """Merges all datasets, keeps relevant columns, and formats fips codes
-    correctly.
+def data_merger(dataframe1, dataframe2, dataframe3, dataframe4):
+    """Merges all datasets and keeps relevant columns. Each daily case row
+    looks up its county attributes and its state's party by position, and
+    rows without a match are dropped. FIPS codes stay integers here and are
+    only formatted by fips_formatter when csv_exporter writes them.
     """
 
-    df = (dataframe1.merge(dataframe2, on='STATE')
-                    .merge(dataframe3, on='COUNTYFP', how='inner')
-                    .merge(dataframe4, on='COUNTYFP', how='inner')
-                    .merge(dataframe5, on='COUNTYFP', how='inner')
-                    .merge(dataframe6, on='COUNTYFP', how='inner'))
+    fips_validator(dataframe1['COUNTYFP'], dataframe4['COUNTYFP'], 'cases')
 
-    df = df.drop(['CLINTON_VOTES', 'TRUMP_VOTES'], 1)
+    states = dataframe1['STATE'].astype('category')
+    parties = (dataframe2.set_index('STATE')['PARTY_ID']
+                         .reindex(states.cat.categories)
+                         .to_numpy())
+    state_codes = states.cat.codes.to_numpy()
 
-    df['DEATH_RATE'] = df['DEATHS'] / df['CASES']
+    county_positions = county_position_finder(dataframe3, dataframe1['COUNTYFP'])
 
-    df['COUNTYFP'] = df['COUNTYFP'].astype(str)
-    df['COUNTYFP'] = ['0' + fips if len(fips) == 6 else fips for fips in df['COUNTYFP']]
-    df['COUNTYFP'] = [fips[:-2] for fips in df['COUNTYFP']]
+    keep = ((county_positions >= 0)
+            & (state_codes >= 0)
+            & pd.notna(parties[state_codes])
+            & (dataframe1['DATE'] <= '2020-12-01').to_numpy())
+
+    df = dataframe1[keep].reset_index(drop=True)
+
+    df['PARTY_ID'] = parties[state_codes[keep]]
+
+    for column in ['POP_EST_2019', 'POP_DENSITY', 'COUNTY_PCT_DIFF']:
+        df[column] = dataframe3[column].to_numpy()[county_positions[keep]]
+
+    df['DEATH_RATE'] = df['DEATHS'] / df['CASES']
 
     df['INFECTION_RATE'] = (df['CASES'] / df['POP_EST_2019']) * 100
 
-    df = df[df['DATE'] <= '2020-12-01']
+    df = schema_applier(df)
+
+    return df
+
+
+def county_store_builder(dataframe1, dataframe2, dataframe3, dataframe4):
+    """Builds the county attribute store, one row per county found in every
+    table and the shape file in FIPS order, with the binary party and the
+    density and vote margin bins derived from them.
+    """
+
+    sources = {
+        'population': dataframe1,
+        'density': dataframe2,
+        'county votes': dataframe3,
+    }
+    for source, dataframe in sources.items():
+        fips_validator(dataframe['COUNTYFP'], dataframe4['COUNTYFP'], source)
+
+    tables = []
+    for dataframe in [dataframe1, dataframe2, dataframe3]:
+        table = dataframe.set_index('COUNTYFP')
+        tables.append(table[~table.index.duplicated()])
+
+    df = pd.concat(tables, axis=1, join='inner')
+
+    df = df[df.index.isin(dataframe4['COUNTYFP'])]
+    df = df.sort_index().rename_axis('COUNTYFP').reset_index()
+
+    df['BINARY_PARTY_ID'] = np.greater(df['COUNTY_PCT_DIFF'].to_numpy(), 0)
+
+    df = bin_creator(df, columns=['DENSITY_BINS', 'VOTE_BINS'])
+    df = schema_applier(df)
 
     return df
 
 
-def bin_creator(dataframe):
+def county_position_finder(dataframe, values):
+    """Returns the row of the county attribute store holding each FIPS code
+    in values, or -1 for codes that are not in the store.
+    """
+
+    fips = dataframe['COUNTYFP'].to_numpy()
+    values = np.asarray(values)
+
+    positions = np.searchsorted(fips, values)
+    positions[positions == len(fips)] = 0
+
+    positions[fips[positions] != values] = -1
+
+    return positions
+
+
+def bin_creator(dataframe, columns=('INFECTION_BINS', 'DENSITY_BINS', 'VOTE_BINS')):
     """Creates bins for continuous variables that will be used for 
-    choropleths.
+    choropleths. Only the requested bin columns are added, so callers should
+    pass just the rows they are going to plot.
     """
 
-    df = dataframe.copy()
+    bins = {
+        'INFECTION_BINS': (
+            'INFECTION_RATE',
+            [-np.inf, 1, 2, 3, 4, 5, np.inf],
+            ['Less than 1', '1 to 2', '2 to 3', '3 to 4', '4 to 5', '5 +']
+        ),
+        'DENSITY_BINS': (
+            'POP_DENSITY',
+            [-np.inf, 1, 20, 80, 250, 500, np.inf],
+            ['Less than 1', '1 to 20', '20 to 80', '80 to 250', '250 to 500', '500 +']
+        ),
+        'VOTE_BINS': (
+            'COUNTY_PCT_DIFF',
+            [-.99, -.66, -.33, 0, .33, .66, .99],
+            ['-0.99 to -0.66', '-0.66 to -0.33', '-0.33 to 0', '0 to 0.33',
+             '0.33 to 0.66', '0.66 to 0.99']
+        ),
+    }
 
-    infection_conditions = [
-        df['INFECTION_RATE'] < 1,
-        ((df['INFECTION_RATE'] >= 1) & (df['INFECTION_RATE'] < 2)),
-        ((df['INFECTION_RATE'] >= 2) & (df['INFECTION_RATE'] < 3)),
-        ((df['INFECTION_RATE'] >= 3) & (df['INFECTION_RATE'] < 4)),
-        ((df['INFECTION_RATE'] >= 4) & (df['INFECTION_RATE'] < 5)),
-        df['INFECTION_RATE'] >= 5
-    ]
-    infection_groups = [
-        'Less than 1',
-        '1 to 2',
-        '2 to 3',
-        '3 to 4',
-        '4 to 5',
-        '5 +'
-    ]
-    df['INFECTION_BINS'] = np.select(infection_conditions, infection_groups)
-
-    density_conditions = [
-        df['POP_DENSITY'] < 1,
-        ((df['POP_DENSITY'] >= 1) & (df['POP_DENSITY'] < 20)),
-        ((df['POP_DENSITY'] >= 20) & (df['POP_DENSITY'] < 80)),
-        ((df['POP_DENSITY'] >= 80) & (df['POP_DENSITY'] < 250)),
-        ((df['POP_DENSITY'] >= 250) & (df['POP_DENSITY'] < 500)),
-        df['POP_DENSITY'] >= 500
-    ]
-    density_groups = [
-        'Less than 1',
-        '1 to 20',
-        '20 to 80',
-        '80 to 250',
-        '250 to 500',
-        '500 +'
-    ]
-    df['DENSITY_BINS'] = np.select(density_conditions, density_groups)
-
-    vote_conditions = [
-        ((df['COUNTY_PCT_DIFF'] >= -.99) & (df['COUNTY_PCT_DIFF'] < -.66)),
-        ((df['COUNTY_PCT_DIFF'] >= -.66) & (df['COUNTY_PCT_DIFF'] < -.33)),
-        ((df['COUNTY_PCT_DIFF'] >= -.33) & (df['COUNTY_PCT_DIFF'] < 0)),
-        ((df['COUNTY_PCT_DIFF'] >= 0) & (df['COUNTY_PCT_DIFF'] < .33)),
-        ((df['COUNTY_PCT_DIFF'] >= .33) & (df['COUNTY_PCT_DIFF'] < .66)),
-        ((df['COUNTY_PCT_DIFF'] >= .66) & (df['COUNTY_PCT_DIFF'] < .99))
-    ]
-    vote_groups = [
-        '-0.99 to -0.66',
-        '-0.66 to -0.33',
-        '-0.33 to 0',
-        '0 to 0.33',
-        '0.33 to 0.66',
-        '0.66 to 0.99'
-    ]
-    df['VOTE_BINS'] = np.select(vote_conditions, vote_groups)
+    df = dataframe.copy(deep=False)
+
+    for column in columns:
+        source, edges, groups = bins[column]
+        df[column] = bin_lookup(df[source], edges, groups)
+
+    df = schema_applier(df)
 
     return df
 
 
+def bin_lookup(values, edges, groups):
+    """Assigns each value to the group whose left-closed interval
+    [edges[i], edges[i + 1]) contains it with a single binary search. Values
+    outside every interval are left missing.
+    """
+
+    values = np.asarray(values)
+    edges = np.asarray(edges, dtype=values.dtype)
+
+    codes = np.searchsorted(edges, values, side='right') - 1
+    codes[(codes >= len(groups)) | np.isnan(values)] = -1
+
+    categories = pd.Categorical.from_codes(codes, categories=groups)
+
+    return categories
+
+
 def region_grouper(dataframe):
     """Creates a new column that puts states into regional bins."""
 
-    df = dataframe.copy()
+    df = dataframe.copy(deep=False)
 
     north_east_regions = [
         'Connecticut',
@@ -742,11 +2004,130 @@ def region_grouper(dataframe):
         midwest_regions,
         western_regions
     ]
-
-    region_conditions = [df['STATE'].isin(region) for region in regions]
     region_groups = ['Northeast', 'South', 'Midwest', 'West']
 
-    df['REGION'] = np.select(region_conditions, region_groups)
+    state_regions = {state: group for region, group in zip(regions, region_groups)
+                         for state in region}
+
+    # Resolve the region once per distinct state, then spread it to the rows
+    # through the state's categorical code. Code -1 (a missing state) picks
+    # the trailing -1 and stays missing.
+    states = df['STATE'].astype('category')
+    lookup = pd.Categorical(
+        [state_regions.get(state) for state in states.cat.categories],
+        categories=region_groups
+    )
+    region_codes = np.append(lookup.codes, -1)[states.cat.codes]
+
+    df['REGION'] = pd.Categorical.from_codes(region_codes, categories=region_groups)
+
+    df = schema_applier(df)
+
+    return df
+
+
+def case_cube_updater(dataframe):
+    """Brings the daily totals cube in DATA_DIR up to date with the fact table
+    and returns it, aggregating again only the last CASES_RESYNC_DAYS stored
+    unless the labels or the HISTORY digest of the earlier rows changed.
+    """
+
+    path = os.path.join(DATA_DIR, 'case-cube.npz')
+
+    df = region_grouper(dataframe[['DATE', 'STATE', 'PARTY_ID', 'CASES', 'DEATHS']])
+
+    dates, date_index = np.unique(df['DATE'].to_numpy(), return_inverse=True)
+    rows = np.bincount(date_index, minlength=len(dates))
+
+    row_hashes = pd.util.hash_pandas_object(
+        df[['DATE'] + CUBE_DIMENSIONS + ['CASES', 'DEATHS']], index=False).to_numpy()
+    date_order = np.argsort(date_index, kind='stable')
+
+    def history_digest(date_count):
+        """Hashes the rows of the first date_count dates."""
+        history = date_order[:rows[:date_count].sum()]
+        return hashlib.sha256(row_hashes[history].tobytes()).hexdigest()
+
+    labels = {}
+    codes = {}
+    for dimension in CUBE_DIMENSIONS:
+        values = df[dimension].astype('category').cat.remove_unused_categories()
+        labels[dimension] = np.asarray(values.cat.categories, dtype=str)
+        codes[dimension] = values.cat.codes.to_numpy()
+
+    kept = 0
+    if os.path.exists(path):
+        with np.load(path) as stored:
+            stored = dict(stored)
+
+        cutoff = stored['DATE'].max() - np.timedelta64(CASES_RESYNC_DAYS, 'D')
+        kept = int(np.searchsorted(stored['DATE'], cutoff))
+
+        unchanged = ('HISTORY' in stored
+                     and kept <= len(dates)
+                     and np.array_equal(stored['DATE'][:kept], dates[:kept])
+                     and all(np.array_equal(stored[dimension], labels[dimension])
+                             for dimension in CUBE_DIMENSIONS)
+                     and str(stored['HISTORY']) == history_digest(kept))
+        if not unchanged:
+            kept = 0
+
+    new_rows = date_index >= kept
+    new_date_index = date_index[new_rows] - kept
+    new_dates = len(dates) - kept
+
+    next_cutoff = dates.max() - np.timedelta64(CASES_RESYNC_DAYS, 'D')
+    cube = {'DATE': dates, 'ROWS': rows,
+            'HISTORY': np.array(history_digest(int(np.searchsorted(dates, next_cutoff))))}
+    for dimension in CUBE_DIMENSIONS:
+        cube[dimension] = labels[dimension]
+
+        dimension_codes = codes[dimension][new_rows]
+        labelled = dimension_codes >= 0
+        cells = new_date_index[labelled] * len(labels[dimension]) + dimension_codes[labelled]
+        shape = (new_dates, len(labels[dimension]))
+
+        def totals(weights=None):
+            if weights is not None:
+                weights = np.nan_to_num(weights[new_rows][labelled].astype('float64'))
+            summed = np.bincount(cells, weights, minlength=shape[0] * shape[1])
+            return summed.reshape(shape)
+
+        counts = totals().astype('int64')
+        measures = {'CASES': totals(df['CASES'].to_numpy()),
+                    'DEATHS': totals(df['DEATHS'].to_numpy())}
+
+        if kept:
+            counts = np.concatenate([stored[dimension + '_ROWS'][:kept], counts])
+
+        cube[dimension + '_ROWS'] = counts
+        for measure, cumulative in measures.items():
+            if kept:
+                history = np.nan_to_num(stored['{}_{}'.format(dimension, measure)][:kept])
+                cumulative = np.concatenate([history, cumulative])
+
+            cumulative[counts == 0] = np.nan
+            new = np.full_like(cumulative, np.nan)
+            new[1:] = np.diff(cumulative, axis=0)
+
+            cube['{}_{}'.format(dimension, measure)] = cumulative
+            cube['{}_NEW_{}'.format(dimension, measure)] = new
+
+    store_writer(path, lambda file: np.savez(file, **cube))
+
+    return cube
+
+
+def cube_slicer(cube, dimension, measure):
+    """Returns one measure of the daily aggregate cube as a dataframe indexed
+    by date with a column for each label of the dimension.
+    """
+
+    df = pd.DataFrame(
+        cube['{}_{}'.format(dimension, measure)],
+        index=pd.Index(cube['DATE'], name='DATE'),
+        columns=cube[dimension]
+    )
 
     return df
 
@@ -767,45 +2148,26 @@ def default_graph(ax):
     return ax
 
 
-def plotter(dataframe):
+def plotter(cube):
     """Creates two plots. First, the daily change in Coronavirus cases over time
     between states who voted for Clinton in 2016 and states who voted for
     Trump in 2016. Second, the daily change in Coronavirus cases over time
     in different regions of the United States.
     """
 
-    df = dataframe.copy()
-
-    df = df[df['DATE'] <= '2020-12-01']
-
-    df['DATE'] = pd.to_datetime(df['DATE'])
-    grouped_df = (df.groupby(['DATE', 'PARTY_ID'])
-                    .agg({'CASES': 'sum', 'DEATH_RATE': 'mean'})
-                    .reset_index())
-
-    """Calculates daily new cases for first subplot."""
-    grouped_cases = (grouped_df.pivot(index='DATE',
-                                      columns='PARTY_ID',
-                                      values='CASES')
+    """Reads daily new cases by party for first subplot."""
+    grouped_cases = (cube_slicer(cube, 'PARTY_ID', 'NEW_CASES')
+                        .rename(columns={'Democratic': 'DEM_NEW_CASES',
+                                         'Republican': 'GOP_NEW_CASES'})
+                        .reset_index())
+
+    """Reads daily new cases by region for second subplot."""
+    regions_df = (cube_slicer(cube, 'REGION', 'NEW_CASES')
+                     .rename(columns={'Midwest': 'MW_NEW_CASES',
+                                      'Northeast': 'NE_NEW_CASES',
+                                      'South': 'S_NEW_CASES',
+                                      'West': 'W_NEW_CASES'})
                      .reset_index())
-    grouped_cases['DATE'] = pd.to_datetime(grouped_cases['DATE'])
-    grouped_cases['DEM_NEW_CASES'] = grouped_cases['Democratic'].diff(1)
-    grouped_cases['GOP_NEW_CASES'] = grouped_cases['Republican'].diff(1)
-
-    """Calculates new daily cases by region for second subplot."""
-    regions_df = (df.groupby(['DATE', 'REGION'])
-                    .agg({'CASES': 'sum'})
-                    .reset_index()
-                    .pivot(index='DATE',
-                           columns='REGION',
-                           values='CASES')
-                    .reset_index())
-
-    regions_df['DATE'] = pd.to_datetime(regions_df['DATE'])
-    regions_df['MW_NEW_CASES'] = regions_df['Midwest'].diff(1)
-    regions_df['NE_NEW_CASES'] = regions_df['Northeast'].diff(1)
-    regions_df['S_NEW_CASES'] = regions_df['South'].diff(1)
-    regions_df['W_NEW_CASES'] = regions_df['West'].diff(1)
 
     """Plots grouped dataframes."""
     fig, axs = plt.subplots(2, 1, figsize=(15, 10))
@@ -989,10 +2351,21 @@ def plotter(dataframe):
     plt.close()
 
 
-def df_to_gdf(dataframe):
-    """Converts a normal pandas dataframe into a geopandas dataframe."""
+def df_to_gdf(dataframe1, dataframe2, width_pixels=None):
+    """Converts a slice of the daily fact table into a geopandas dataframe by
+    attaching each county's geometry, or only the outlines that
+    geometry_level_finder picks for a map width_pixels wide.
+    """
+
+    geometry_cols = [col for col in dataframe2.columns if col.startswith('GEOMETRY')]
+    geometry = pd.DataFrame(dataframe2[['COUNTYFP'] + geometry_cols])
+
+    if width_pixels is not None:
+        level = geometry_level_finder(geometry, width_pixels)
+        geometry = pd.DataFrame({'COUNTYFP': geometry['COUNTYFP'],
+                                 'GEOMETRY': geometry[level]})
 
-    df = dataframe.copy()
+    df = pd.DataFrame(dataframe1).merge(geometry, on='COUNTYFP', how='inner')
 
     df = GeoDataFrame(
         df,
@@ -1003,6 +2376,22 @@ def df_to_gdf(dataframe):
     return df
 
 
+def county_bin_attacher(dataframe, counties, column):
+    """Returns a copy of dataframe with a bin column precomputed in the
+    county attribute store (counties) looked up for each row's county.
+    """
+
+    df = dataframe.copy(deep=False)
+
+    positions = county_position_finder(counties, df['COUNTYFP'])
+    codes = counties[column].cat.codes.to_numpy()[positions]
+    codes[positions < 0] = -1
+
+    df[column] = pd.Categorical.from_codes(codes, categories=counties[column].cat.categories)
+
+    return df
+
+
 def label_creator(dictionary):
     """Returns the keys of a dictionary in reverse order.
     Helper function to create categorial labels in GeoPandas choropleths.
@@ -1015,12 +2404,14 @@ def label_creator(dictionary):
 
 
 def choropleth_plotter(dataframe, column, cmap, plot_title, legend_title,
-                       legend_labels, filename):
-    """Creates choropleth and saves as a .png."""
+                       legend_labels, filename, figsize=(17, 10), dpi=800):
+    """Creates choropleth and saves as a .png. Draws the simplified county
+    outlines that match the output resolution when they are available.
+    """
 
-    df = dataframe.copy()
+    df = geometry_level_selector(dataframe, figsize[0] * dpi)
 
-    fig, ax = plt.subplots(figsize=(17, 10))
+    fig, ax = plt.subplots(figsize=figsize)
     df.plot(ax=ax,
             column=column,
             linewidth=0.5,
@@ -1041,16 +2432,28 @@ def choropleth_plotter(dataframe, column, cmap, plot_title, legend_title,
         text.set_text(label)
 
     #plt.show;
-    plt.savefig(filename, dpi=800, facecolor='white')
+    plt.savefig(filename, dpi=dpi, facecolor='white')
     plt.close()
 
 
+def choropleth_infection_data(dataframe, geo):
+    """Returns the infection bin of each county along with only the outlines
+    drawn in the infection choropleth.
+    """
+
+    df = dataframe[dataframe['DATE'] == '2020-12-01']
+    df = bin_creator(df, columns=['INFECTION_BINS'])
+    df = df_to_gdf(df[['COUNTYFP', 'INFECTION_BINS']], geo, CHOROPLETH_WIDTH_PIXELS)
+
+    return df
+
+
 def choropleth_infection(dataframe):
-    """Saves a choropleth of the infection rate across the continential U.S."""
+    """Saves a choropleth of the infection rate across the continential U.S.
+    from the output of choropleth_infection_data.
+    """
 
-    df = dataframe.copy()
-    df = df[df['DATE'] == '2020-12-01']
-    df = df_to_gdf(df)
+    df = dataframe.copy(deep=False)
 
     infection_rankings = {
         '5 +': 5,
@@ -1062,7 +2465,7 @@ def choropleth_infection(dataframe):
     }
     infection_labels = label_creator(infection_rankings)
 
-    df['INFECTION_RANKINGS'] = df['INFECTION_BINS'].map(infection_rankings)
+    df['INFECTION_RANKINGS'] = df['INFECTION_BINS'].astype(object).map(infection_rankings)
 
     choropleth_plotter(dataframe=df,
                        column='INFECTION_RANKINGS',
@@ -1073,14 +2476,24 @@ def choropleth_infection(dataframe):
                        filename='Infection Choropleth.png')
 
 
+def choropleth_density_data(dataframe, geo, counties):
+    """Returns the density bin of each county, read from the county attribute
+    store, along with only the outlines drawn in the density choropleth.
+    """
+
+    df = dataframe[dataframe['DATE'] == '2020-12-01']
+    df = county_bin_attacher(df[['COUNTYFP']], counties, 'DENSITY_BINS')
+    df = df_to_gdf(df, geo, CHOROPLETH_WIDTH_PIXELS)
+
+    return df
+
+
 def choropleth_density(dataframe):
     """Saves a choropleth of the population density across the continential 
-    U.S.
+    U.S. from the output of choropleth_density_data.
     """
 
-    df = dataframe.copy()
-    df = df[df['DATE'] == '2020-12-01']
-    df = df_to_gdf(df)
+    df = dataframe.copy(deep=False)
 
     density_rankings = {
         '500 +': 5,
@@ -1092,7 +2505,7 @@ def choropleth_density(dataframe):
     }
     density_labels = label_creator(density_rankings)
 
-    df['DENSITY_RANKINGS'] = df['DENSITY_BINS'].map(density_rankings)
+    df['DENSITY_RANKINGS'] = df['DENSITY_BINS'].astype(object).map(density_rankings)
 
     choropleth_plotter(dataframe=df,
                        column='DENSITY_RANKINGS',
@@ -1103,14 +2516,25 @@ def choropleth_density(dataframe):
                        filename='Density Choropleth.png')
 
 
+def choropleth_vote_data(dataframe, geo, counties):
+    """Returns the vote margin bin of each county, read from the county
+    attribute store, along with only the outlines drawn in the vote
+    choropleth.
+    """
+
+    df = dataframe[dataframe['DATE'] == '2020-12-01']
+    df = county_bin_attacher(df[['COUNTYFP']], counties, 'VOTE_BINS')
+    df = df_to_gdf(df, geo, CHOROPLETH_WIDTH_PIXELS)
+
+    return df
+
+
 def choropleth_vote(dataframe):
     """Saves a choropleth of 2016 Clinton Vote Margin across the continential 
-    U.S.
+    U.S. from the output of choropleth_vote_data.
     """
 
-    df = dataframe.copy()
-    df = df[df['DATE'] == '2020-12-01']
-    df = df_to_gdf(df)
+    df = dataframe.copy(deep=False)
 
     vote_rankings = {
         '0.66 to 0.99': 5,
@@ -1122,7 +2546,7 @@ def choropleth_vote(dataframe):
     }
     vote_labels = label_creator(vote_rankings)
 
-    df['VOTE_RANKINGS'] = df['VOTE_BINS'].map(vote_rankings)
+    df['VOTE_RANKINGS'] = df['VOTE_BINS'].astype(object).map(vote_rankings)
 
     leg_title = ('         Clinton 2016 Margin'
                  '\n(Percent Difference vs. Trump)')
@@ -1136,31 +2560,287 @@ def choropleth_vote(dataframe):
                        filename='Vote Choropleth.png')
 
 
-def run_ols(dataframe):
-    """Takes dataframe, runs two regressions, and writes each regression
-    output into a .txt file.
+def run_ols(panel):
+    """Fits every regression in OLS_SPECS for every date of the panel, writes
+    the coefficients by date into a .csv file, and writes the December 1, 2020
+    regressions into .txt files.
+    """
+
+    fits = ols_batch_fitter(panel)
+    fits.to_csv('Regressions by Date.csv', index=False)
+
+    for name in ['Total Cases', 'Infection Rate']:
+        summary = ols_summarizer(panel, name, '2020-12-01')
+        with open('{} Regression.txt'.format(name), 'w') as file:
+            file.write(summary.as_text())
+
+
+def ols_panel_builder(dataframe, counties):
+    """Lays out every column used in OLS_SPECS as a dates by counties array,
+    taking daily columns from the fact table and county attributes from the
+    county attribute store.
+    """
+
+    dates, date_index = np.unique(dataframe['DATE'].to_numpy(), return_inverse=True)
+    fips, county_index = np.unique(dataframe['COUNTYFP'].to_numpy(), return_inverse=True)
+
+    observed = np.zeros((len(dates), len(fips)), dtype=bool)
+    observed[date_index, county_index] = True
+
+    positions = county_position_finder(counties, fips)
+
+    panel = {'DATE': dates, 'COUNTYFP': fips}
+
+    columns = {column for y_column, x_columns in OLS_SPECS.values()
+                   for column in [y_column] + x_columns}
+
+    for column in sorted(columns):
+        values = np.full((len(dates), len(fips)), np.nan)
+        if column in dataframe.columns and column not in counties.columns:
+            values[date_index, county_index] = dataframe[column].to_numpy(dtype='float64')
+        else:
+            attribute = counties[column].to_numpy(dtype='float64')[positions]
+            attribute[positions < 0] = np.nan
+            np.copyto(values, attribute, where=observed)
+        panel[column] = values
+
+    return panel
+
+
+def ols_design_builder(panel, spec):
+    """Returns the dependent variable, the design matrix with a leading
+    intercept column, and the mask of usable observations for one of
+    OLS_SPECS, as dates by counties (by terms) arrays.
+    """
+
+    y_column, x_columns = OLS_SPECS[spec]
+
+    y = panel[y_column]
+    x = np.stack([np.ones_like(y)] + [panel[column] for column in x_columns], axis=-1)
+
+    mask = np.isfinite(y) & np.isfinite(x).all(axis=-1)
+
+    return y, x, mask
+
+
+def ols_batch_fitter(panel, specs=None):
+    """Fits the named OLS_SPECS for every date of the panel in one stacked QR
+    decomposition and returns the coefficient, standard error, observations,
+    and r-squared of every term, leaving unidentified fits missing.
+    """
+
+    if specs is None:
+        specs = list(OLS_SPECS)
+
+    frames = []
+    for spec in specs:
+        y, x, mask = ols_design_builder(panel, spec)
+        terms = ['Intercept'] + OLS_SPECS[spec][1]
+
+        y = np.where(mask, y, 0.0)
+        x = np.where(mask[..., None], x, 0.0)
+
+        scale = np.abs(x).max(axis=(0, 1))
+        scale[scale == 0] = 1.0
+        x = x / scale
+
+        nobs = mask.sum(axis=1)
+        q, r = np.linalg.qr(x)
+
+        diagonal = np.abs(np.diagonal(r, axis1=1, axis2=2))
+        identified = ((nobs > len(terms))
+                      & (diagonal.min(axis=1) > 1e-10 * diagonal.max(axis=1)))
+        r[~identified] = np.eye(len(terms))
+
+        r_inv = np.linalg.inv(r)
+        qty = np.einsum('dnk,dn->dk', q, y)
+        beta = np.einsum('dkl,dl->dk', r_inv, qty)
+        xtx_inv = np.einsum('dkm,dlm->dkl', r_inv, r_inv)
+
+        residuals = np.where(mask, y - np.einsum('dnk,dk->dn', x, beta), 0.0)
+        ssr = (residuals ** 2).sum(axis=1)
+        y_mean = y.sum(axis=1) / np.maximum(nobs, 1)
+        sst = (np.where(mask, y - y_mean[:, None], 0.0) ** 2).sum(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sigma2 = ssr / (nobs - len(terms))
+            r_squared = 1 - ssr / sst
+        std_err = np.sqrt(sigma2[:, None] * np.diagonal(xtx_inv, axis1=1, axis2=2))
+
+        beta = beta / scale
+        std_err = std_err / scale
+        beta[~identified] = np.nan
+        std_err[~identified] = np.nan
+        r_squared[~identified] = np.nan
+
+        frames.append(pd.DataFrame({
+            'SPEC': spec,
+            'DATE': np.repeat(panel['DATE'], len(terms)),
+            'TERM': np.tile(terms, len(panel['DATE'])),
+            'COEF': beta.ravel(),
+            'STD_ERR': std_err.ravel(),
+            'NOBS': np.repeat(nobs, len(terms)),
+            'R_SQUARED': np.repeat(r_squared, len(terms)),
+        }))
+
+    df = pd.concat(frames, ignore_index=True)
+
+    return df
+
+
+def ols_summarizer(panel, spec, date):
+    """Refits one of OLS_SPECS for a single date with statsmodels, straight
+    from the panel arrays, and returns its regression summary.
+    """
+
+    y, x, mask = ols_design_builder(panel, spec)
+    y_column, x_columns = OLS_SPECS[spec]
+
+    row = np.searchsorted(panel['DATE'], np.datetime64(date))
+
+    model = sm.OLS(y[row][mask[row]], x[row][mask[row]]).fit()
+    summary = model.summary(yname=y_column, xname=['Intercept'] + x_columns)
+
+    return summary
+
+
+def run_resampling(panel, resamples=RESAMPLES, executor=None, max_workers=None):
+    """Estimates the bootstrap standard error and interval and the permutation
+    p-value of BINARY_PARTY_ID in the December 1, 2020 regressions and writes
+    them into a .csv file, leaving out draws that cannot be solved.
+    """
+
+    row = np.searchsorted(panel['DATE'], np.datetime64('2020-12-01'))
+
+    results = []
+    for spec in ['Total Cases', 'Infection Rate']:
+        y, x, mask = ols_design_builder(panel, spec)
+        y, x = y[row][mask[row]], x[row][mask[row]]
+        term = OLS_SPECS[spec][1].index('BINARY_PARTY_ID') + 1
+
+        estimate = np.linalg.lstsq(x, y, rcond=None)[0][term]
+
+        for method in ['bootstrap', 'permutation']:
+            start = time.perf_counter()
+            draws = ols_resampler(y, x, term, method, resamples, executor, max_workers)
+            seconds = time.perf_counter() - start
+            draws = draws[np.isfinite(draws)]
+
+            result = {
+                'SPEC': spec,
+                'METHOD': method,
+                'ESTIMATE': estimate,
+                'RESAMPLES': len(draws),
+                'STD_ERR': np.nan,
+                'CI_LOWER': np.nan,
+                'CI_UPPER': np.nan,
+                'P_VALUE': np.nan,
+                'SECONDS': seconds,
+            }
+            if method == 'bootstrap':
+                result['STD_ERR'] = draws.std(ddof=1)
+                result['CI_LOWER'], result['CI_UPPER'] = np.percentile(draws, [2.5, 97.5])
+            else:
+                extreme = np.count_nonzero(np.abs(draws) >= np.abs(estimate))
+                result['P_VALUE'] = (extreme + 1) / (len(draws) + 1)
+            results.append(result)
+
+    df = pd.DataFrame(results)
+    df.to_csv('Party Resampling Inference.csv', index=False)
+
+    print('{:<24}{:>14}{:>18}'.format('Resampling', 'Seconds', 'Resamples/sec'))
+    for result in results:
+        print('{:<24}{:>14.1f}{:>18.0f}'.format(
+            '{} {}'.format(result['SPEC'], result['METHOD']),
+            result['SECONDS'],
+            result['RESAMPLES'] / result['SECONDS']
+        ))
+
+    return df
+
+
+def ols_resampler(y, x, term, method, resamples, executor=None, max_workers=None,
+                  seed=RESAMPLE_SEED):
+    """Returns the coefficient on column term of x across resamples draws of
+    method, run in seeded chunks of RESAMPLE_CHUNK on executor or on a spawn
+    pool of max_workers processes.
+    """
+
+    chunks = -(-resamples // RESAMPLE_CHUNK)
+    seeds = np.random.SeedSequence(seed).spawn(chunks)
+    sizes = [min(RESAMPLE_CHUNK, resamples - chunk * RESAMPLE_CHUNK) for chunk in range(chunks)]
+    kernel = functools.partial(ols_resample_kernel, y, x, term, method)
+
+    if executor is not None:
+        draws = list(executor.map(kernel, seeds, sizes))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn')) as own_executor:
+            draws = list(own_executor.map(kernel, seeds, sizes))
+
+    draws = np.concatenate(draws)
+
+    return draws
+
+
+def ols_resample_kernel(y, x, term, method, seed, size):
+    """Fits size bootstrap or permutation draws of the regression of y on x as
+    one stack and returns their coefficients on column term, with NaN for
+    draws that are singular.
     """
 
-    df = dataframe.copy()
+    rng = np.random.default_rng(seed)
 
-    df = df[df['DATE'] == '2020-12-01']
-    df['BINARY_PARTY_ID'] = [1 if pct > 0 else 0 for pct in df['COUNTY_PCT_DIFF']]
+    scale = np.abs(x).max(axis=0)
+    scale[scale == 0] = 1.0
+    x = x / scale
 
-    cases_formula = 'CASES ~ BINARY_PARTY_ID + POP_EST_2019'
-    rate_formula = 'INFECTION_RATE ~ BINARY_PARTY_ID'
-    formulas = [cases_formula, rate_formula]
+    if method == 'bootstrap':
+        index = rng.integers(0, len(y), size=(size, len(y)))
+        x_draws = x[index]
+        y_draws = y[index]
+    else:
+        x_draws = np.repeat(x[None], size, axis=0)
+        x_draws[:, :, term] = rng.permuted(x_draws[:, :, term], axis=1)
+        y_draws = np.broadcast_to(y, (size, len(y)))
 
-    models = [smf.ols(formula=formula, data=df).fit() for formula in formulas]
-    summaries = [model.summary() for model in models]
+    xtx = np.einsum('bnk,bnl->bkl', x_draws, x_draws)
+    xty = np.einsum('bnk,bn->bk', x_draws, y_draws)
 
-    output_names = ['Total Cases Regression', 'Infection Rate Regression']
+    try:
+        beta = np.linalg.solve(xtx, xty[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        beta = np.full(xty.shape, np.nan)
+        for draw in range(size):
+            try:
+                beta[draw] = np.linalg.solve(xtx[draw], xty[draw])
+            except np.linalg.LinAlgError:
+                pass
 
-    ols_dict = dict(zip(output_names, summaries))
+    coefficients = beta[:, term] / scale[term]
 
-    for name, output in ols_dict.items():
-        with open('{}.txt'.format(name), 'w') as file:
-            file.write(output.as_text())
+    return coefficients
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description='Analyzes partisanship and Coronavirus cases by county.')
+    parser.add_argument('--target', action='append',
+                        choices=list(pipeline_stages()),
+                        help='run only this stage and what it depends on '
+                             '(may be repeated, defaults to every output)')
+    parser.add_argument('--csv', action='store_true',
+                        help='also export every intermediate dataframe as .csv')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='number of stages to run at the same time')
+    parser.add_argument('--force', action='store_true',
+                        help='rerun stages even when their memoized result is current')
+    parser.add_argument('--profile', action='append',
+                        choices=list(pipeline_stages()),
+                        help='run this stage under cProfile and save the statistics '
+                             'next to the trace (may be repeated)')
+    args = parser.parse_args()
+
+    main(targets=args.target, export_csv=args.csv, max_workers=args.workers,
+         force=args.force, profile=args.profile)
\ No newline at end of file